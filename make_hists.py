@@ -1,154 +1,412 @@
 import sys
+import time
 import argparse
+import traceback
 import uproot
 import numpy as np
 import yaml
 from tqdm import tqdm
 import pickle
-import ROOT
 import boost_histogram as bh
 import mplhep as hep
 from matplotlib import pyplot as plt
 
-from models.fitter import Fitter
+from models.fitter import Fitter, validate_fast_mtt
 from models.sample import Sample
+from models.catalog import Catalog
 from models.group import Group
 from models.data import Data
 from models.reducible import Reducible
+from models.stitching import NJET_FAMILIES
+from models.prefetch import Prefetcher
+from models.scan import scan_threshold, scan_window, write_table
+from models.trigger import TriggerSF
+from models.tau_es import TauES
+from models.cache import WarmCache
+from models.shards import WorkQueue, plan_shards, merge_hists, merge_lookup_tables
+# the tau ID SF tools read their inputs through ROOT and are imported in
+# run() only when the config uses them
 sys.path.append("../../TauPOG/TauIDSFs/python/")
-from TauIDSFTool import TauIDSFTool
-from TauIDSFTool import TauESTool
-import ScaleFactor as SF
         
 # >> python MHBG.py configs/config_MHBG.yaml
 parser = argparse.ArgumentParser('MHBG.py')
 add_arg = parser.add_argument
 add_arg('config', nargs='?', default='configs/config_MHBG.yaml')
-args = parser.parse_args()
-with open(args.config) as f:
-    config = yaml.load(f)
-
-# read in parameters from config file
-era, era_int = str(config['year']), config['year']
-tight_cuts, loose_cuts = not config['loose_cuts'], config['loose_cuts']
-loose_cuts = config['loose_cuts']
-data_driven = config['data_driven']
-shift_ES = config['shift_ES']
-analysis = config['analysis']
-sign = config['sign']
-tau_ID_SF = config['tau_ID_SF']
-LT_cut = config['LT_cut']
-redo_fit = config['redo_fit']
-fitter = config['fitter']
-data_dir = config['data_dir']
-mass = config['mass']
-
-if shift_ES not in ['None', 'Down', 'Up']:
-    raise ValueError("{0} is not a valid tau_ES (please use 'None', 'Down', or 'Up')"
-                     .format(tau_ES))
-
-categories = {1:'eeet', 2:'eemt', 3:'eett', 4:'eeem', 
-              5:'mmet', 6:'mmmt', 7:'mmtt', 8:'mmem'}
-lumi = {'2016' : 35.92*10**3, '2017' : 41.53*10**3, '2018' : 59.74*10**3}
-
-# configure the tau energy scale by year
-campaign  = {2016:'2016Legacy', 2017:'2017ReReco', 2018:'2018ReReco'}
-t_ES_tool = TauESTool(campaign[era_int]) # properly ID'd taus
-f_ES_tool = TauESTool(campaign[era_int]) # incorrectly ID'd taus
-
-# configure the TauID Scale Factor (SF) Tool
-antiJet_SF = TauIDSFTool(campaign[era_int], 'DeepTau2017v2p1VSjet', 'Medium')
-antiEle_SF = TauIDSFTool(campaign[era_int], 'antiEleMVA6', 'Loose')
-antiMu_SF  = TauIDSFTool(campaign[era_int], 'antiMu3', 'Tight')
-
-# trigger scale factors
-mu_files   = {2016:'SingleMuon_Run2016_IsoMu24orIsoMu27.root',
-              2017:'SingleMuon_Run2017_IsoMu24orIsoMu27.root',
-              2018:'SingleMuon_Run2018_IsoMu24orIsoMu27.root'}
-ele_files  = {2016:'SingleElectron_Run2016_Ele25orEle27.root',
-              2017:'SingleElectron_Run2017_Ele32orEle35.root',
-              2018:'SingleElectron_Run2018_Ele32orEle35.root'}
-trigger_SF = {'dir':'../tools/ScaleFactors/TriggerEffs/',
-              'fileMuon':'Muon/{0:s}'.format(mu_files[era_int]),
-              'fileElectron':'Electron/{0:s}'.format(ele_files[era_int])}
-
-mu_trig_SF = SF.SFs()
-mu_trig_SF.ScaleFactor("{0:s}{1:s}".format(trigger_SF['dir'],
-                                           trigger_SF['fileMuon']))
-ele_trig_SF = SF.SFs()
-ele_trig_SF.ScaleFactor("{0:s}{1:s}".format(trigger_SF['dir'],
-                                            trigger_SF['fileElectron']))
-
-# build diTau mass fitter
-FastMTT = Fitter(config['fitter'], ES_tool=t_ES_tool, shift=shift_ES, save_table=False, redo_fit=False)
-
-# build analyzers for each MC group
-reducible = Reducible(categories, antiJet_SF, antiEle_SF, antiMu_SF, fitter=FastMTT)
-rare = Group(categories, antiJet_SF, antiEle_SF, antiMu_SF, fitter=FastMTT)
-signal = Group(categories, antiJet_SF, antiEle_SF, antiMu_SF, fitter=FastMTT)
-ZZ = Group(categories, antiJet_SF, antiEle_SF, antiMu_SF, fitter=FastMTT)
-MC_groups = {"Reducible" : reducible, "Rare" : rare, "Signal" : signal, "ZZ" : ZZ}
-
-# open sample csv file
-for line in open("../MC/MCsamples_{0:s}_{1:s}.csv".format(era, analysis), 'r').readlines():
-    vals = line.split(',')
-    if (vals[5].lower() == 'ignore'): continue
-    nickname, group = vals[0], vals[1]
-    if (analysis == 'AZH' and 'AToZh' in nickname):
-        if (str(mass) not in nickname): continue 
-    xsec, total_weight = float(vals[2]), float(vals[4])
-    sample_weight = lumi[era]*xsec/total_weight 
-    path = "../MC/condor/{0:s}/{1:s}_{2:s}/{1:s}_{2:s}.root".format(analysis, nickname, era)
-    sample = Sample(nickname, path, xsec, total_weight, sample_weight,
-                    lookup_path="lookup_tables")
-    MC_groups[group].add_sample(sample)
-    print(" ... added {0} to {1}".format(nickname, group))
-
-reducible.reweight_nJets(lumi[era])
-#signal.reweight_samples(10.0)
-
-for group in MC_groups.keys():
-    print("Analyzing {0} events".format(group.lower()))    
-
-    # add "free" hists from ntuple
-    for var, hist in config['var_hists'].items():
-        MC_groups[group].add_hist(var, hist[0], hist[1], hist[2], from_ntuple=True)
-
-    if (group != "Signal"): continue
-    MC_groups[group].process_samples(tight_cuts=tight_cuts, sign=sign, data_driven=data_driven, 
-                                     tau_ID_SF=tau_ID_SF, redo_fit=redo_fit, LT_cut=LT_cut)
-
-# build a data analyzer
-#data_path = data_dir + "/condor/{0:s}/{1:s}/{1:s}_data.root".format(analysis, era)
-#data = Data(categories, antiJet_SF, antiEle_SF, antiMu_SF, era_int)
-#data_sample = Sample('data', data_path, 1.0, 1.0, 1.0)
-#data.add_sample(data_sample)
-#data.process_samples(tight_cuts=tight_cuts, sign=sign, data_driven=data_driven,
-#                     tau_ID_SF=tau_ID_SF, redo_fit=redo_fit, LT_cut=LT_cut)
-
-
-# ---------- output histograms ---------- 
-def output_hists(group, hists, cat=None):
-    outdir = "/eos/uscms/store/user/jdezoort/AZH_hists"
-    with open("{0}/{1}_{2}_M{3}_{4}.pkl"
-              .format(outdir, analysis, era, mass, group), 'wb') as f:
-        pickle.dump(hists, f, protocol=pickle.HIGHEST_PROTOCOL)
+add_arg('--plan', metavar='QUEUE_DIR', help='split the run into shards in QUEUE_DIR')
+add_arg('--worker', metavar='QUEUE_DIR', help='process shards from QUEUE_DIR')
+add_arg('--merge', metavar='QUEUE_DIR', help='merge the finished shards in QUEUE_DIR')
+add_arg('--requeue', metavar='QUEUE_DIR',
+        help='move stale running and failed shards in QUEUE_DIR back to todo')
+add_arg('--lease-seconds', type=float, default=600.,
+        help='a running shard without a heartbeat for this long is stale')
+add_arg('--scan', action='store_true',
+        help='scan the LT and mtt_fit cuts instead of filling hists')
+add_arg('--shard-seconds', type=float, default=600.,
+        help='estimated processing time per shard')
+add_arg('--samples', help='comma-separated subset of samples to process')
+add_arg('--validate-fastmtt', nargs='?', const='FastMTT', choices=['FastMTT', 'm_sv'],
+        help='compare FastMTT_numpy with the C++ FastMTT (default, needs ROOT) '
+        'or with the m_sv stored in the ntuples')
+add_arg('--refill', action='store_true',
+        help='refill the region hists from the saved selections only')
+add_arg('--daemon', metavar='SPOOL_DIR', help='run jobs submitted to SPOOL_DIR')
+add_arg('--submit', metavar='SPOOL_DIR', help='submit the config as a job to SPOOL_DIR')
+add_arg('--cache-items', type=int, default=512,
+        help='daemon: maximum number of warm tools and open files')
+add_arg('--cache-min-free', type=float, default=4000.,
+        help='daemon: evict warm state when less memory is free [MB]')
+
+def run(args, cache=None, names=None):
+
+    # tools and opened files are kept warm across jobs in daemon mode
+    def warm(key, factory):
+        if cache is None: return factory()
+        return cache.get(key, factory)
+
+    with open(args.config) as f:
+        config = yaml.load(f)
+
+    # read in parameters from config file
+    era, era_int = str(config['year']), config['year']
+    tight_cuts, loose_cuts = not config['loose_cuts'], config['loose_cuts']
+    loose_cuts = config['loose_cuts']
+    data_driven = config['data_driven']
+    shift_ES = config['shift_ES']
+    analysis = config['analysis']
+    sign = config['sign']
+    tau_ID_SF = config['tau_ID_SF']
+    LT_cut = config['LT_cut']
+    redo_fit = config['redo_fit']
+    fitter = config['fitter']
+    data_dir = config['data_dir']
+    mass = config['mass']
+
+    if shift_ES not in ['None', 'Down', 'Up']:
+        raise ValueError("{0} is not a valid tau_ES (please use 'None', 'Down', or 'Up')"
+                         .format(tau_ES))
+
+    categories = {1:'eeet', 2:'eemt', 3:'eett', 4:'eeem', 
+                  5:'mmet', 6:'mmmt', 7:'mmtt', 8:'mmem'}
+    lumi = {'2016' : 35.92*10**3, '2017' : 41.53*10**3, '2018' : 59.74*10**3}
+
+    # configure the tau energy scale by year (tau_ES: false runs without it)
+    campaign  = {2016:'2016Legacy', 2017:'2017ReReco', 2018:'2018ReReco'}
+    TES_dir = '../../TauPOG/TauIDSFs/data/'
+    t_ES_tool, f_ES_tool = None, None
+    if config.get('tau_ES', True):
+        t_ES_tool = warm(('TauES', era_int, 't'), lambda:
+                         TauES(campaign[era_int], path=TES_dir)) # properly ID'd taus
+        f_ES_tool = warm(('TauES', era_int, 'f'), lambda:
+                         TauES(campaign[era_int], path=TES_dir)) # incorrectly ID'd taus
+
+    # configure the TauID Scale Factor (SF) Tool
+    antiJet_SF, antiEle_SF, antiMu_SF = None, None, None
+    if tau_ID_SF:
+        from TauIDSFTool import TauIDSFTool
+        antiJet_SF = warm(('TauIDSFTool', era_int, 'antiJet'), lambda:
+                          TauIDSFTool(campaign[era_int], 'DeepTau2017v2p1VSjet', 'Medium'))
+        antiEle_SF = warm(('TauIDSFTool', era_int, 'antiEle'), lambda:
+                          TauIDSFTool(campaign[era_int], 'antiEleMVA6', 'Loose'))
+        antiMu_SF  = warm(('TauIDSFTool', era_int, 'antiMu'), lambda:
+                          TauIDSFTool(campaign[era_int], 'antiMu3', 'Tight'))
+
+    # trigger scale factors
+    mu_files   = {2016:'SingleMuon_Run2016_IsoMu24orIsoMu27.root',
+                  2017:'SingleMuon_Run2017_IsoMu24orIsoMu27.root',
+                  2018:'SingleMuon_Run2018_IsoMu24orIsoMu27.root'}
+    ele_files  = {2016:'SingleElectron_Run2016_Ele25orEle27.root',
+                  2017:'SingleElectron_Run2017_Ele32orEle35.root',
+                  2018:'SingleElectron_Run2018_Ele32orEle35.root'}
+    trigger_SF = {'dir':'../tools/ScaleFactors/TriggerEffs/',
+                  'fileMuon':'Muon/{0:s}'.format(mu_files[era_int]),
+                  'fileElectron':'Electron/{0:s}'.format(ele_files[era_int])}
+
+    trigger_SFs = None
+    if config.get('trigger_SF', False):
+        mu_path = "{0:s}{1:s}".format(trigger_SF['dir'], trigger_SF['fileMuon'])
+        ele_path = "{0:s}{1:s}".format(trigger_SF['dir'], trigger_SF['fileElectron'])
+        trigger_SFs = {'mm':warm(('TriggerSF', mu_path), lambda: TriggerSF(mu_path)),
+                       'ee':warm(('TriggerSF', ele_path), lambda: TriggerSF(ele_path))}
+
+    # build diTau mass fitter
+    experimental = config.get('experimental_fitter', False)
+    FastMTT = warm(('Fitter', fitter, era_int, shift_ES, experimental, t_ES_tool is not None),
+                   lambda: Fitter(config['fitter'], ES_tool=t_ES_tool, shift=shift_ES,
+                                  save_table=False, redo_fit=False,
+                                  experimental=experimental))
+
+    # read upcoming samples in the background (prefetch_memory in MB)
+    prefetch_bytes = config.get('prefetch_memory', 2000)*1024**2
+    prefetcher = warm(('Prefetcher', prefetch_bytes),
+                      lambda: Prefetcher(max_bytes=prefetch_bytes))
+
+    # in daemon mode, sample files stay open between jobs; a regenerated file
+    # (new size or mtime in its catalog entry) is opened again
+    opener = None
+    if cache is not None:
+        opener = lambda path, info: cache.get(('events', path, info['size'], info['mtime']),
+                                              lambda: uproot.open(path)["Events"])
+
+    # ---------- output histograms ---------- 
+    def output_hists(group, hists, cat=None):
+        outdir = "/eos/uscms/store/user/jdezoort/AZH_hists"
+        with open("{0}/{1}_{2}_M{3}_{4}.pkl"
+                  .format(outdir, analysis, era, mass, group), 'wb') as f:
+            pickle.dump(hists, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def output_root(group, hists, cat=None):
+        outdir = "/eos/uscms/store/user/jdezoort/AZH_hists"
+        root_file = uproot.recreate("{0}/{1}_{2}_M{3}_{4}.root"
+                                    .format(outdir, analysis, era, mass, group))
+        for name, hists_per_cat in hists.items():
+            print(name, hists_per_cat)
+            for cat, hist in hists_per_cat.items():
+                #print(cat, hist)
+                root_file["{0}_{1}".format(cat, name)] = hist.to_numpy()
+
+    # ---------- build analyzers ----------
+    def build_groups():
+        reducible = Reducible(categories, antiJet_SF, antiEle_SF, antiMu_SF, fitter=FastMTT,
+                              prefetcher=prefetcher, trigger_SFs=trigger_SFs)
+        rare = Group(categories, antiJet_SF, antiEle_SF, antiMu_SF, fitter=FastMTT,
+                     prefetcher=prefetcher, trigger_SFs=trigger_SFs)
+        signal = Group(categories, antiJet_SF, antiEle_SF, antiMu_SF, fitter=FastMTT,
+                       prefetcher=prefetcher, trigger_SFs=trigger_SFs)
+        ZZ = Group(categories, antiJet_SF, antiEle_SF, antiMu_SF, fitter=FastMTT,
+                   prefetcher=prefetcher, trigger_SFs=trigger_SFs)
+        MC_groups = {"Reducible" : reducible, "Rare" : rare, "Signal" : signal, "ZZ" : ZZ}
+
+        # add "free" hists from ntuple
+        for group in MC_groups.values():
+            for var, hist in config['var_hists'].items():
+                group.add_hist(var, hist[0], hist[1], hist[2], from_ntuple=True,
+                               expression=(hist[5] if len(hist) > 5 else None))
+            if (config.get('n_bootstrap', 0) > 0):
+                group.add_bootstrap_hists(config['n_bootstrap'])
+            add_regions(group)
+        return MC_groups
+
+    # alternative selections filled from the bit-packed selection masks
+    def add_regions(group):
+        for name, expression in config.get('regions', {}).items():
+            group.add_region(name, expression)
+        group.selection_dir = config.get('selection_dir')
+
+    def add_samples(MC_groups):
+
+        # cached sample metadata, so that no files are opened before processing
+        catalog_path = "catalogs/{0:s}_{1:s}.pkl".format(era, analysis)
+        catalog = warm(('Catalog', catalog_path), lambda: Catalog(catalog_path))
+
+        # open sample csv file
+        for line in open("../MC/MCsamples_{0:s}_{1:s}.csv".format(era, analysis), 'r').readlines():
+            vals = line.split(',')
+            if (vals[5].lower() == 'ignore'): continue
+            nickname, group = vals[0], vals[1]
+            if (analysis == 'AZH' and 'AToZh' in nickname):
+                if (str(mass) not in nickname): continue 
+            xsec, total_weight = float(vals[2]), float(vals[4])
+            sample_weight = lumi[era]*xsec/total_weight 
+            path = "../MC/condor/{0:s}/{1:s}_{2:s}/{1:s}_{2:s}.root".format(analysis, nickname, era)
+            sample = Sample(nickname, path, xsec, total_weight, sample_weight,
+                            lookup_path="lookup_tables", catalog=catalog,
+                            opener=opener)
+            MC_groups[group].add_sample(sample)
+            print(" ... added {0} to {1}".format(nickname, group))
+        catalog.save()
+
+        MC_groups["Reducible"].stitch_samples(lumi[era], config.get('stitching', NJET_FAMILIES))
+        #MC_groups["Signal"].reweight_samples(10.0)
+
+    def claim_shard(queue, MC_groups):
+        shard = queue.claim()
+        if shard is None: return None
+        group = MC_groups[shard['group']]
+        sample = group.samples[shard['sample']].split(shard['start'], shard['stop'])
+        sample.lookup_tag = shard['id']
+
+        # the lease is renewed from the claim on, also while the shard waits
+        # for the current one to finish
+        heartbeat = queue.heartbeat(shard, interval=args.lease_seconds/4.)
+        return shard, group, sample, heartbeat
+
+    def run_worker(queue, MC_groups):
+        claimed = claim_shard(queue, MC_groups)
+        while claimed is not None:
+            shard, group, sample, heartbeat = claimed
+            print("Processing shard {0}: {1} [{2}, {3})"
+                  .format(shard['id'], shard['sample'], shard['start'], shard['stop']))
+
+            # claim the next shard now, so its entry range is read during this one
+            claimed = claim_shard(queue, MC_groups)
+            if claimed is not None:
+                prefetcher.prefetch(claimed[2], claimed[1].get_branches())
+
+            full_sample = group.samples[sample.name]
+            group.samples[sample.name] = sample
+            group.reset_hists()
+            start_time = time.time()
+            try: group.process_samples(names=[sample.name], **process_args)
+            except Exception:
+                traceback.print_exc()
+                queue.fail(shard)
+                continue
+            finally:
+                heartbeat.set()
+                group.samples[sample.name] = full_sample
+            queue.complete(shard, group.get_hists(), time.time() - start_time)
+
+    process_args = dict(tight_cuts=tight_cuts, sign=sign, data_driven=data_driven,
+                        tau_ID_SF=tau_ID_SF, redo_fit=redo_fit, LT_cut=LT_cut)
+    active_groups = ["Signal"]
+    MC_groups = build_groups()
+
+    # yields and significance vs. LT threshold and mtt_fit window
+    if args.scan:
+        add_samples(MC_groups)
+        for group in MC_groups.values():
+            group.add_scan_hists(target='mA')
+            group.process_samples(scan=True, **process_args)
+        for var, scan in [('LT', scan_threshold), ('mtt_fit', scan_window)]:
+            signal = MC_groups["Signal"].scan_hists[var]
+            background = sum(MC_groups[group].scan_hists[var] for group in MC_groups
+                             if group != "Signal")
+            header = (['LT_cut'] if var == 'LT' else ['mtt_low', 'mtt_high'])
+            write_table("scans/{0}_{1}_M{2}_{3}.csv".format(analysis, era, mass, var),
+                        header + ['signal', 'background', 'significance'],
+                        scan(signal, background))
+        return 0
+
+    # refill the regions from the selections saved by a previous run
+    if args.refill:
+        add_samples(MC_groups)
+        for group in active_groups:
+            MC_groups[group].fill_saved_regions(config['selection_dir'])
+            output_hists("{0}_regions".format(group.lower()),
+                         {var:MC_groups[group].hists[var]
+                          for var in MC_groups[group].region_hists})
+        return 0
+
+    # compare the numpy FastMTT with a reference on the active groups
+    if args.validate_fastmtt:
+        add_samples(MC_groups)
+        passed = True
+        for group in active_groups:
+            samples = MC_groups[group].samples
+            for name in (names or list(samples)):
+                if (name not in samples or samples[name].n_entries < 1): continue
+                sample = samples[name]
+                sample.load()
+                sample.parse_categories(categories, sample.array('cat'))
+                print("Validating FastMTT_numpy on {0}".format(name))
+                passed &= validate_fast_mtt(sample, ES_tool=t_ES_tool,
+                                            reference=args.validate_fastmtt)
+        return 0 if passed else 1
+
+    # split the run into shards for any number of workers
+    if args.plan:
+        add_samples(MC_groups)
+        queue = WorkQueue(args.plan)
+        shards = plan_shards({group:MC_groups[group] for group in active_groups},
+                             fitter, costs=queue.costs(), shard_seconds=args.shard_seconds)
+        queue.create(shards)
+        print("Planned {0} shards in {1}".format(len(shards), args.plan))
+        return 0
+
+    # process shards until the queue is empty
+    if args.worker:
+        add_samples(MC_groups)
+        run_worker(WorkQueue(args.worker), MC_groups)
+        return 0
+
+    # sum the partial histograms and cutflows of a finished queue
+    if args.merge:
+        queue = WorkQueue(args.merge)
+        pending = queue.pending()
+        if any(pending.values()):
+            print("ERROR: queue {0} is not finished {1}".format(args.merge, pending))
+            return 1
+        for group, hists in merge_hists(queue.results()).items():
+            MC_groups[group].hists = hists
+        merge_lookup_tables("lookup_tables")
+        queue.update_costs()
+    else:
+        add_samples(MC_groups)
+        for group in MC_groups.keys():
+            print("Analyzing {0} events".format(group.lower()))    
+            if (group not in active_groups): continue
+            if names is None:
+                MC_groups[group].process_samples(**process_args)
+                continue
+            group_names = [name for name in names if name in MC_groups[group].samples]
+            if group_names:
+                MC_groups[group].process_samples(names=group_names, **process_args)
+
+    # build a data analyzer from the primary datasets, removing their overlap
+    data = None
+    if not (config.get('MC_only', True) or args.merge):
+        data = Data(categories, antiJet_SF, antiEle_SF, antiMu_SF, era_int,
+                    prefetcher=prefetcher)
+        for var, hist in config['var_hists'].items():
+            data.add_hist(var, hist[0], hist[1], hist[2], from_ntuple=True,
+                          expression=(hist[5] if len(hist) > 5 else None))
+        add_regions(data)
+        catalog_path = "catalogs/{0:s}_{1:s}.pkl".format(era, analysis)
+        catalog = warm(('Catalog', catalog_path), lambda: Catalog(catalog_path))
+        for stream, data_path in config['data_streams'].items():
+            data.add_sample(Sample(stream, data_path, 1.0, 1.0, 1.0,
+                                   catalog=catalog, opener=opener))
+        catalog.save()
+        data.remove_overlap(config.get('data_priority'),
+                            method=config.get('overlap_method', 'sort'))
+        data.process_samples(**process_args)
 
-def output_root(group, hists, cat=None):
     outdir = "/eos/uscms/store/user/jdezoort/AZH_hists"
-    root_file = uproot.recreate("{0}/{1}_{2}_M{3}_{4}.root"
-                                .format(outdir, analysis, era, mass, group))
-    for name, hists_per_cat in hists.items():
-        print(name, hists_per_cat)
-        for cat, hist in hists_per_cat.items():
-            #print(cat, hist)
-            root_file["{0}_{1}".format(cat, name)] = hist.to_numpy()
-        
-outdir = "/eos/uscms/store/user/jdezoort/AZH_hists"
-for group in MC_groups.keys(): 
-    output_hists(group.lower(), MC_groups[group].get_hists())
-    output_root(group.lower(), MC_groups[group].get_hists())
-    #output_hists("data", data.get_hists())
+    for group in MC_groups.keys(): 
+        output_hists(group.lower(), MC_groups[group].get_hists())
+        output_root(group.lower(), MC_groups[group].get_hists())
+    if data is not None:
+        output_hists("data", data.get_hists())
+        output_root("data", data.get_hists())
+    return 0
+
+def run_daemon(spool, cache, poll_seconds=2.):
+    queue = WorkQueue(spool)
+    queue.make_dirs()
+    print("Waiting for jobs in {0}".format(spool))
+    while True:
+        job = queue.claim()
+        if job is None:
+            time.sleep(poll_seconds)
+            continue
+        print("Running job {0}: {1}".format(job['id'], job['config']))
+        start_time = time.time()
+        try: status = run(parser.parse_args([job['config']]), cache=cache,
+                          names=job.get('samples'))
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        if status != 0:
+            print("Job {0} failed".format(job['id']))
+            queue.fail(job)
+        else: queue.complete(job, None, time.time() - start_time)
+        cache.trim()
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.submit:
+        job = {'config':args.config, 'samples':args.samples.split(',') if args.samples else None}
+        print("Submitted job {0}".format(WorkQueue(args.submit).submit(job)))
+        sys.exit(0)
+    if args.requeue:
+        moved = WorkQueue(args.requeue).requeue(lease_seconds=args.lease_seconds)
+        print("Requeued {0} stale and {1} failed shards".format(moved['running'],
+                                                                moved['failed']))
+        sys.exit(0)
+    if args.daemon:
+        run_daemon(args.daemon, WarmCache(max_items=args.cache_items,
+                                          min_free_mb=args.cache_min_free))
+    sys.exit(run(args, names=args.samples.split(',') if args.samples else None))
 
 """def pickle_hists(cat, hists, tag):
     for name, hist in hists.items():
@@ -0,0 +1,22 @@
+import numpy as np
+
+# cumulative Poisson(1) probabilities for k = 0, ..., 19
+POISSON_CDF = np.cumsum(np.exp(-1.0)/np.cumprod(np.maximum(np.arange(20), 1)))
+
+def splitmix64(x):
+    with np.errstate(over='ignore'):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def poisson_weights(run, lumi, evt, n_replicas, seed=0):
+    # hash (run, lumi, evt) so each event gets the same weights in every job
+    h = splitmix64(np.asarray(run).astype(np.uint64) ^ np.uint64(seed))
+    h = splitmix64(h ^ np.asarray(lumi).astype(np.uint64))
+    h = splitmix64(h ^ np.asarray(evt).astype(np.uint64))
+
+    # one independent uniform per (event, replica)
+    replicas = splitmix64(np.arange(n_replicas, dtype=np.uint64))
+    u = (splitmix64(h[:, None] ^ replicas[None, :]) >> np.uint64(11)) * 2.0**-53
+    return np.searchsorted(POISSON_CDF, u, side='right').astype(np.uint8)
@@ -0,0 +1,43 @@
+import gc
+import collections
+
+def available_memory():
+    # MemAvailable [MB], or None where /proc/meminfo does not exist
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1])/1024.
+    except IOError: pass
+    return None
+
+# least-recently-used store for tools and open files shared between jobs
+class WarmCache(object):
+    def __init__(self, max_items=512, min_free_mb=4000.):
+        self.max_items = max_items
+        self.min_free_mb = min_free_mb
+        self.items = collections.OrderedDict()
+
+    def get(self, key, factory):
+        if key in self.items:
+            self.items.move_to_end(key)
+            return self.items[key]
+        value = factory()
+        self.items[key] = value
+        return value
+
+    def trim(self):
+        while len(self.items) > self.max_items:
+            self.evict()
+        while self.items:
+            free = available_memory()
+            if free is None or free >= self.min_free_mb: break
+            key = self.evict()
+            print("Evicting {0} (free memory {1:.0f} MB)".format(key, free))
+            gc.collect()
+
+    def evict(self):
+        # least recently used first; values holding threads are closed
+        key, value = self.items.popitem(last=False)
+        if hasattr(value, 'close'): value.close()
+        return key
@@ -0,0 +1,46 @@
+import os
+import pickle
+import uproot
+
+# cached metadata (entries, size, mtime, branches) for each sample file;
+# a file is only re-opened if its size or mtime has changed
+class Catalog(object):
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.modified = False
+        try:
+            with open(path, 'rb') as f:
+                self.files = pickle.load(f)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            print("WARNING: creating new sample catalog {0}".format(path))
+
+    def get(self, path):
+        try: stat = os.stat(path)
+        except OSError:
+            print("ERROR: failed to stat file {0:s}".format(path))
+            return {'entries':0, 'size':0, 'mtime':0, 'branches':[]}
+
+        info = self.files.get(path)
+        if (info is not None and info['size'] == stat.st_size and
+            info['mtime'] == stat.st_mtime): return info
+
+        # (re)build the entry from the file itself
+        events = uproot.open(path)["Events"]
+        branches = [b.decode() if isinstance(b, bytes) else b
+                    for b in events.keys()]
+        info = {'entries':events.numentries, 'size':stat.st_size,
+                'mtime':stat.st_mtime, 'branches':branches}
+        self.files[path] = info
+        self.modified = True
+        return info
+
+    def save(self):
+        if not self.modified: return
+        outdir = os.path.dirname(self.path)
+        if outdir and not os.path.isdir(outdir): os.makedirs(outdir)
+        tmp_path = "{0}.tmp{1}".format(self.path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self.files, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self.modified = False
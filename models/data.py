@@ -1,23 +1,19 @@
-import sys
 import uproot
 import numpy as np
 import yaml
 from tqdm import tqdm
-import ROOT
 import boost_histogram as bh
 
 from .fitter import Fitter
 from .sample import Sample
 from .group  import Group
-sys.path.append("../../TauPOG/TauIDSFs/python/")
-from TauIDSFTool import TauIDSFTool
-from TauIDSFTool import TauESTool
-import ScaleFactor as SF
-import fakeFactor2
+from .overlap import event_keys, find_duplicates, EventIndex
 
 class Data(Group):
-    def __init__(self, categories, antiJet_SF, antiEle_SF, antiMu_SF, year, fitter=None):
-        Group.__init__(self, categories, antiJet_SF, antiEle_SF, antiMu_SF, fitter=None)
+    def __init__(self, categories, antiJet_SF, antiEle_SF, antiMu_SF, year, fitter=None,
+                 prefetcher=None):
+        Group.__init__(self, categories, antiJet_SF, antiEle_SF, antiMu_SF, fitter=None,
+                       prefetcher=prefetcher)
         self.year = year
         self.h_group = []
 
@@ -34,6 +30,7 @@ class Data(Group):
         fW1['tt'], fW2['tt'], fW0['tt'] = self.get_fake_weights(f1_tt, f2_tt)
         fW1['em'], fW2['em'], fW0['em'] = self.get_fake_weights(fe, fm)
 
+        self.checkpoint_cutflow(sample)
         self.h_group = np.array(['Reducible' for _ in range(sample.n_entries)])
         for i, (t1, t2) in enumerate(zip(tight1, tight2)):
             if (not t1) and t2:   sample.weights[i] = fW1[sample.tt[i]]
@@ -43,15 +40,53 @@ class Data(Group):
                 sample.weights[i] = 1.0
                 self.h_group[i] = 'data'
 
-    def process_samples(self, tight_cuts, sign, data_driven, tau_ID_SF, redo_fit, LT_cut):
-        progress_bar= tqdm(self.samples.items())
+    def remove_overlap(self, priority=None, method='sort', chunk_size=10**7):
+        # the same event can be in several primary datasets, keep only the
+        # copy from the dataset listed first in priority
+        if priority is None: priority = []
+        rank = lambda name: (priority.index(name) if name in priority
+                             else len(priority), name)
+        samples = [self.samples[name] for name in sorted(self.samples, key=rank)]
+
+        if (method == 'sort'):
+            keys = [event_keys(s.array('run'), s.array('evt')) for s in samples]
+            for sample, duplicates in zip(samples, find_duplicates(keys)):
+                sample.duplicates = duplicates
+        elif (method == 'index'):
+            index = EventIndex()
+            for sample in samples:
+                duplicates = [np.array([], dtype=np.int64)]
+                for start in range(0, sample.n_entries, chunk_size):
+                    stop = min(start + chunk_size, sample.n_entries)
+                    chunk = sample.split(sample.entry_start + start,
+                                         sample.entry_start + stop)
+                    keys = event_keys(chunk.read_array('run'), chunk.read_array('evt'))
+                    duplicates.append(index.add(keys) + start)
+                sample.duplicates = np.concatenate(duplicates)
+        else:
+            raise ValueError("{0} is not a valid overlap method (please use 'sort' or 'index')"
+                             .format(method))
+
+        for sample in samples:
+            print(" ... removing {0} duplicate events from {1}"
+                  .format(len(sample.duplicates), sample.name))
+
+    def process_samples(self, tight_cuts, sign, data_driven, tau_ID_SF, redo_fit, LT_cut,
+                        names=None):
+        samples = self.get_samples(names)
+        progress_bar= tqdm(self.prefetched(samples), total=len(samples))
         for name, sample in progress_bar:
             if (sample.n_entries < 1): continue
+            sample.load()
             progress_bar.set_description("{0}".format(name.ljust(20)[:20]))
             sample.weights = np.ones(sample.n_entries)
-            sample.parse_categories(self.categories, sample.events.array('cat'))
+            sample.parse_categories(self.categories, sample.array('cat'))
+            if sample.duplicates is not None:
+                duplicate = np.zeros(sample.n_entries, dtype=bool)
+                duplicate[sample.duplicates] = True
+                self.apply_cut(sample, duplicate, fill_value=0.5, selection='unique')
 
-            self.fill_cutflow(0.5, sample)
+            self.mark_cutflow(0.5, sample)
 
             if (tight_cuts):
                 self.sign_cut(sample, sign, fill_value=1.5)
@@ -64,8 +99,14 @@ class Data(Group):
                 else:
                     h_group = ['data' for _ in range(sample.n_entries)]
                     self.tau_cut(sample, tight1, tight2, fill_value=4.5)
+            else: self.record_selections(sample)
 
-            self.fill_cutflow(5.5, sample)
+            self.mark_cutflow(5.5, sample)
             self.H_LT_cut(LT_cut, sample, fill_value=6.5)
+
+            # data is not fitted and gets no tau SFs, every event is complete
+            sample.fitted[:] = True
             #self.mtt_fit_cut(sample, fill_value=7.5)
             self.fill_hists(sample, blind=True)
+            self.fill_cutflow(sample)
+            self.save_selection(sample)
@@ -0,0 +1,139 @@
+import ast
+import numpy as np
+
+# numexpr evaluates whole expressions multithreaded without temporaries;
+# without it every node is evaluated with numpy
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+# arrays computed by the analysis instead of read from the ntuple
+INTERNAL = ('mtt_fit', 'm4l', 'mA', 'mA_c', 'weights')
+
+FUNCTIONS = {'abs' : np.abs, 'sqrt' : np.sqrt, 'exp' : np.exp, 'log' : np.log,
+             'sin' : np.sin, 'cos' : np.cos, 'tan' : np.tan, 'arctan2' : np.arctan2,
+             'sinh' : np.sinh, 'cosh' : np.cosh, 'tanh' : np.tanh, 'where' : np.where}
+
+OPERATORS = {ast.Add : np.add, ast.Sub : np.subtract, ast.Mult : np.multiply,
+             ast.Div : np.true_divide, ast.Pow : np.power, ast.BitAnd : np.logical_and,
+             ast.BitOr : np.logical_or, ast.Lt : np.less, ast.LtE : np.less_equal,
+             ast.Gt : np.greater, ast.GtE : np.greater_equal, ast.Eq : np.equal,
+             ast.NotEq : np.not_equal}
+
+SYMBOLS = {ast.Add : '+', ast.Sub : '-', ast.Mult : '*', ast.Div : '/', ast.Pow : '**',
+           ast.BitAnd : '&', ast.BitOr : '|', ast.Lt : '<', ast.LtE : '<=', ast.Gt : '>',
+           ast.GtE : '>=', ast.Eq : '==', ast.NotEq : '!='}
+
+# numbers are ast.Num before python 3.8 and ast.Constant after
+CONSTANTS = tuple(getattr(ast, name) for name in ('Constant', 'Num') if hasattr(ast, name))
+
+def constant_value(node):
+    return node.value if hasattr(node, 'value') else node.n
+
+def subexpressions(node):
+    # keys of the compound nodes below (and including) node
+    if isinstance(node, (ast.Name,) + CONSTANTS): return []
+    return [ast.dump(node)] + [key for child in ast.iter_child_nodes(node)
+                               if isinstance(child, ast.expr)
+                               for key in subexpressions(child)]
+
+def share_subexpressions(expressions):
+    # subexpressions used more than once are evaluated once per sample
+    counts = {}
+    for expression in expressions:
+        for key in subexpressions(expression.tree):
+            counts[key] = counts.get(key, 0) + 1
+    for expression in expressions:
+        expression.shared = set(key for key in subexpressions(expression.tree)
+                                 if counts[key] > 1)
+
+class Expression(object):
+    # arithmetic over branches and internal arrays, e.g. "abs(eta_3 - eta_4)",
+    # parsed and checked once; results are cached per sample (see evaluate)
+    def __init__(self, text):
+        self.text = text
+        self.tree = ast.parse(text, mode='eval').body
+        self.names = []
+        self.check(self.tree)
+        self.names = list(dict.fromkeys(self.names))
+        self.branches = [name for name in self.names if name not in INTERNAL]
+        self.key = ast.dump(self.tree)
+        self.shared = set()
+
+    def check(self, node):
+        if isinstance(node, ast.Name): self.names.append(node.id)
+        elif isinstance(node, CONSTANTS):
+            if not isinstance(constant_value(node), (int, float)):
+                raise ValueError("invalid constant in '{0}'".format(self.text))
+        elif isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+            self.check(node.left)
+            self.check(node.right)
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            self.check(node.operand)
+        elif (isinstance(node, ast.Compare) and len(node.ops) == 1 and
+              type(node.ops[0]) in OPERATORS):
+            self.check(node.left)
+            self.check(node.comparators[0])
+        elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and
+              node.func.id in FUNCTIONS and not node.keywords):
+            for arg in node.args: self.check(arg)
+        else: raise ValueError("invalid expression '{0}'".format(self.text))
+
+    def evaluate(self, sample):
+        # sample.computed holds the input arrays and the (sub)expressions
+        # already evaluated for this sample, shared between expressions
+        return self.evaluate_node(sample, self.tree)
+
+    def get_input(self, sample, name):
+        if name not in sample.computed:
+            if name in INTERNAL: return getattr(sample, name)
+            sample.computed[name] = sample.array(name)
+        return sample.computed[name]
+
+    def evaluate_node(self, sample, node):
+        if isinstance(node, ast.Name): return self.get_input(sample, node.id)
+        if isinstance(node, CONSTANTS): return constant_value(node)
+        key = ast.dump(node)
+        if key in sample.computed: return sample.computed[key]
+        if numexpr is not None:
+            # one fused evaluation, with shared subexpressions as inputs
+            inputs = {}
+            text = self.to_text(sample, node, inputs, top=True)
+            result = numexpr.evaluate(text, local_dict=inputs)
+        elif isinstance(node, ast.BinOp):
+            result = OPERATORS[type(node.op)](self.evaluate_node(sample, node.left),
+                                              self.evaluate_node(sample, node.right))
+        elif isinstance(node, ast.UnaryOp):
+            result = -self.evaluate_node(sample, node.operand)
+        elif isinstance(node, ast.Compare):
+            result = OPERATORS[type(node.ops[0])](self.evaluate_node(sample, node.left),
+                                                  self.evaluate_node(sample, node.comparators[0]))
+        else:
+            result = FUNCTIONS[node.func.id](*[self.evaluate_node(sample, arg)
+                                               for arg in node.args])
+        sample.computed[key] = result
+        return result
+
+    def to_text(self, sample, node, inputs, top=False):
+        if isinstance(node, ast.Name):
+            inputs[node.id] = self.get_input(sample, node.id)
+            return node.id
+        if isinstance(node, CONSTANTS): return repr(constant_value(node))
+        key = ast.dump(node)
+        if not top and (key in sample.computed or key in self.shared):
+            name = "_sub{0}".format(len(inputs))
+            inputs[name] = self.evaluate_node(sample, node)
+            return name
+        if isinstance(node, ast.BinOp):
+            return "({0} {1} {2})".format(self.to_text(sample, node.left, inputs),
+                                          SYMBOLS[type(node.op)],
+                                          self.to_text(sample, node.right, inputs))
+        if isinstance(node, ast.UnaryOp):
+            return "(-{0})".format(self.to_text(sample, node.operand, inputs))
+        if isinstance(node, ast.Compare):
+            return "({0} {1} {2})".format(self.to_text(sample, node.left, inputs),
+                                          SYMBOLS[type(node.ops[0])],
+                                          self.to_text(sample, node.comparators[0], inputs))
+        return "{0}({1})".format(node.func.id, ", ".join(self.to_text(sample, arg, inputs)
+                                                         for arg in node.args))
@@ -0,0 +1,106 @@
+import numpy as np
+
+TAU_MASS = 1.77686
+
+# FastMTT in numpy: the visible tau products carry fractions x1, x2 of the tau
+# momenta (collinear neutrinos) and every (x1, x2) of the FastMTT grid is
+# scored by the MET transfer function times the likelihood of the di-tau mass
+# m = m_vis/sqrt(x1*x2); the best point gives the di-tau 4-vector
+# vis_1/x1 + vis_2/x2
+
+# decay-fraction densities as polynomial coefficients in x, up to their
+# normalization: flat for hadronic decays, the unpolarized spectrum
+# 5/3 - 3x^2 + 4/3x^3 for leptonic decays (m_nunu integrated out)
+HADRONIC = np.array([1., 0., 0., 0.])
+LEPTONIC = np.array([5./3, 0., -3., 4./3])
+
+def p4(pt, eta, phi, m):
+    px, py, pz = pt*np.cos(phi), pt*np.sin(phi), pt*np.sinh(eta)
+    return np.stack([px, py, pz, np.sqrt(px**2 + py**2 + pz**2 + m**2)])
+
+def mass(p):
+    return np.sqrt(np.maximum(p[3]**2 - p[0]**2 - p[1]**2 - p[2]**2, 0))
+
+def x_min(m_vis, hadronic):
+    # hadronic legs heavier than 1.5 GeV are mismeasured and set to 0.3 GeV
+    m_vis = np.where(hadronic & (m_vis > 1.5), 0.3, m_vis)
+    return np.minimum(m_vis**2/TAU_MASS**2, 1)
+
+def integral_power(n, low, high):
+    # integral of t^n from low to high
+    if (n == -1): return np.log(high/low)
+    return (high**(n + 1) - low**(n + 1))/(n + 1)
+
+def mass_likelihood(m, m_vis, x1_min, x2_min, coeff_1, coeff_2):
+    # p1(x1) p2(x2) integrated along x1*x2 = (m_vis/m)^2, times the jacobian
+    # 2 m_vis^2/m^3 of m; coeff_*: (4, ...) density coefficients per event
+    mvs2 = (m_vis/m)**2
+    low = np.maximum(x2_min, mvs2)
+    high = np.minimum(1, mvs2/np.maximum(x1_min, 1e-12))
+    valid = (mvs2 <= 1) & (high > low)
+    low, high = np.where(valid, low, 0.5), np.where(valid, high, 1.)
+
+    # p1(mvs2/t) p2(t)/t = sum of a1_j a2_k mvs2^j t^(k-j-1)
+    integral = np.zeros(np.broadcast(m, m_vis).shape)
+    for j in range(4):
+        if not np.any(coeff_1[j]): continue
+        for k in range(4):
+            if not np.any(coeff_2[k]): continue
+            integral += (coeff_1[j]*coeff_2[k]*mvs2**j
+                         *integral_power(k - j - 1, low, high))
+    return np.where(valid, np.maximum(integral, 0)*2*m_vis**2/m**3, 0)
+
+def fit_batch(vis_1, vis_2, hadronic_1, hadronic_2, met_x, met_y, cov, x):
+    # inverse MET covariance; singular matrices leave only the mass likelihood
+    det = cov[:, 0, 0]*cov[:, 1, 1] - cov[:, 0, 1]*cov[:, 1, 0]
+    det = np.where(det > 0, det, np.inf)
+    inv_00, inv_11 = cov[:, 1, 1]/det, cov[:, 0, 0]/det
+    inv_01 = -(cov[:, 0, 1] + cov[:, 1, 0])/det
+
+    # MET minus the neutrino momenta, (event, x1, x2)
+    nu = 1/x - 1
+    res_x = (met_x[:, None, None] - vis_1[0][:, None, None]*nu[None, :, None]
+             - vis_2[0][:, None, None]*nu[None, None, :])
+    res_y = (met_y[:, None, None] - vis_1[1][:, None, None]*nu[None, :, None]
+             - vis_2[1][:, None, None]*nu[None, None, :])
+    log_L = -0.5*(inv_00[:, None, None]*res_x**2 + inv_01[:, None, None]*res_x*res_y
+                  + inv_11[:, None, None]*res_y**2)
+
+    # mass likelihood, zero below the kinematic limits of x1 and x2
+    m_vis = mass(vis_1 + vis_2)[:, None, None]
+    x1_min = x_min(mass(vis_1), hadronic_1)[:, None, None]
+    x2_min = x_min(mass(vis_2), hadronic_2)[:, None, None]
+    coeff_1 = np.where(hadronic_1[:, None], HADRONIC, LEPTONIC).T[:, :, None, None]
+    coeff_2 = np.where(hadronic_2[:, None], HADRONIC, LEPTONIC).T[:, :, None, None]
+    m = m_vis/np.sqrt(x[None, :, None]*x[None, None, :])
+    L_mass = mass_likelihood(m, m_vis, x1_min, x2_min, coeff_1, coeff_2)
+    L_mass[(x[None, :, None] < x1_min) | (x[None, None, :] < x2_min)] = 0
+    with np.errstate(divide='ignore'):
+        log_L = log_L + np.log(L_mass)
+
+    best = np.argmax(log_L.reshape(len(met_x), -1), axis=1)
+    x_1, x_2 = x[best // len(x)], x[best % len(x)]
+    return vis_1/x_1 + vis_2/x_2
+
+def fast_mtt(vis_1, vis_2, hadronic_1, hadronic_2, met_x, met_y, cov,
+             n_grid=100, batch_size=500):
+    # vis_*: (4, n) visible 4-vectors, cov: (n, 2, 2) MET covariance; events
+    # are fitted in batches on the grid x = 1/n_grid ... 1 - 1/n_grid
+    x = np.arange(1, n_grid)/float(n_grid)
+    tt_p4 = np.zeros(vis_1.shape)
+    for start in range(0, vis_1.shape[1], batch_size):
+        b = slice(start, start + batch_size)
+        tt_p4[:, b] = fit_batch(vis_1[:, b], vis_2[:, b], hadronic_1[b], hadronic_2[b],
+                                met_x[b], met_y[b], cov[b], x)
+    return tt_p4
+
+def compare(reference, masses, rel_tolerance=0.05, min_fraction=0.95):
+    # agreement with the reference masses: at least min_fraction of the
+    # events within rel_tolerance of the reference mass
+    good = (reference > 0)
+    rel_diff = np.abs(masses[good] - reference[good])/reference[good]
+    fraction = np.mean(rel_diff < rel_tolerance) if good.any() else 1.0
+    print("FastMTT: {0:.1%} of {1} events within {2:.0%} (median difference {3:.2%})"
+          .format(fraction, good.sum(), rel_tolerance,
+                  np.median(rel_diff) if good.any() else 0.0))
+    return fraction >= min_fraction
@@ -1,18 +1,36 @@
 import os
 import numpy as np
-import ROOT
 import pickle
 from .sample import Sample
+from .fastmtt import p4, mass, fast_mtt, compare
 from tqdm import tqdm
 
+# only the SVfit and FastMTT modes need ROOT
+try:
+    import ROOT
+except ImportError:
+    ROOT = None
+
 class Fitter:
+    branches = ['run', 'evt', 'lumi', 'met', 'metphi', 'metcov00', 'metcov01',
+                'metcov10', 'metcov11', 'pt_1', 'pt_2', 'eta_1', 'eta_2',
+                'phi_1', 'phi_2', 'pt_3', 'pt_4', 'eta_3', 'eta_4', 'phi_3',
+                'phi_4', 'm_3', 'm_4', 'decayMode_3', 'decayMode_4',
+                'gen_match_3', 'gen_match_4', 'm_sv']
+
     def __init__(self, mode, ES_tool=None, shift='None', 
-                 save_table=False, redo_fit=True):
+                 save_table=False, redo_fit=True, n_grid=100, batch_size=500,
+                 experimental=False):
         self.mode = mode
         self.ES_tool = ES_tool
         self.shift = shift
         self.save_table = save_table
         self.redo_fit = redo_fit
+        self.n_grid = n_grid
+        self.batch_size = batch_size
+        if (mode in ['SVfit', 'FastMTT'] and ROOT is None):
+            raise ImportError("the {0} fitter needs ROOT, use FastMTT_numpy instead"
+                              .format(mode))
 
         # load in the SVfit dependencies...
         if (mode == 'SVfit'):
@@ -36,40 +54,49 @@ class Fitter:
                 else :
                     ROOT.gInterpreter.ProcessLine(".L {0:s}.cc++"
                                                   .format(baseName))
+        # the numpy FastMTT needs nothing to be compiled, but has not been
+        # validated against the C++ FastMTT yet (see validate_fast_mtt)
+        elif (mode == 'FastMTT_numpy'):
+            if not experimental:
+                raise ValueError("FastMTT_numpy is not validated against FastMTT yet, "
+                                 "set experimental_fitter: true to use it anyway")
+
         # otherwise, throw error
         else:
             print("ERROR: initializing fitter with invalid mode '{0}'"
                   .format(mode))
 
 
-    def fit(self, s):
+    def fit(self, s, mask=None):
+        if mask is None: mask = s.mask
+        if (self.mode == 'FastMTT_numpy'): return self.fit_numpy(s, mask)
         
         # grab event info
-        run, evt, lumi = s.events.array('run'), s.events.array('evt'), s.events.array('lumi')
+        run, evt, lumi = s.array('run'), s.array('evt'), s.array('lumi')
     
         # grab MET info
-        met, metphi = s.events.array('met'), s.events.array('metphi')
+        met, metphi = s.array('met'), s.array('metphi')
         measuredMETx, measuredMETy = met*np.cos(metphi), met*np.sin(metphi)
-        covMET_00, covMET_01 = s.events.array('metcov00'), s.events.array('metcov01')
-        covMET_10, covMET_11 = s.events.array('metcov10'), s.events.array('metcov11')
+        covMET_00, covMET_01 = s.array('metcov00'), s.array('metcov01')
+        covMET_10, covMET_11 = s.array('metcov10'), s.array('metcov11')
         
         # grab the lepton arrays
         ele_mass, muo_mass = 0.511*10**-3, 0.105
-        pt_1, pt_2   = s.events.array('pt_1'),  s.events.array('pt_2')
-        eta_1, eta_2 = s.events.array('eta_1'), s.events.array('eta_2')
-        phi_1, phi_2 = s.events.array('phi_1'), s.events.array('phi_2')
+        pt_1, pt_2   = s.array('pt_1'),  s.array('pt_2')
+        eta_1, eta_2 = s.array('eta_1'), s.array('eta_2')
+        phi_1, phi_2 = s.array('phi_1'), s.array('phi_2')
         
         # grab the tau arrays
-        pt_3,  pt_4  = s.events.array('pt_3'),  s.events.array('pt_4')
-        eta_3, eta_4 = s.events.array('eta_3'), s.events.array('eta_4')
-        phi_3, phi_4 = s.events.array('phi_3'), s.events.array('phi_4')
-        m_3,   m_4   = s.events.array('m_3'),   s.events.array('m_4')
-        dm_3,  dm_4  = s.events.array('decayMode_3'),  s.events.array('decayMode_4')
-        match_3, match_4 = s.events.array('gen_match_3'), s.events.array('gen_match_4')
+        pt_3,  pt_4  = s.array('pt_3'),  s.array('pt_4')
+        eta_3, eta_4 = s.array('eta_3'), s.array('eta_4')
+        phi_3, phi_4 = s.array('phi_3'), s.array('phi_4')
+        m_3,   m_4   = s.array('m_3'),   s.array('m_4')
+        dm_3,  dm_4  = s.array('decayMode_3'),  s.array('decayMode_4')
+        match_3, match_4 = s.array('gen_match_3'), s.array('gen_match_4')
     
         # grab original mass fit
-        m_sv = s.events.array('m_sv')
-        progress_bar = tqdm(np.arange(s.n_entries)[s.mask])
+        m_sv = s.array('m_sv')
+        progress_bar = tqdm(np.arange(s.n_entries)[mask])
         for i in progress_bar:
 
             # attempt to find value in lookup table
@@ -108,7 +135,7 @@ class Fitter:
             t2.SetPtEtaPhiM(pt_4[i], eta_4[i], phi_4[i], m_4[i])
 
             # apply tau ES corrections
-            if (s.tt[i] != 'em'):
+            if (s.tt[i] != 'em' and self.ES_tool is not None):
                 if (s.tt[i] == 'tt'): 
                     t1 *= self.ES_tool.getTES(pt_3[i], dm_3[i], match_3[i])
                 t2 *= self.ES_tool.getTES(pt_4[i], dm_4[i], match_4[i])
@@ -198,3 +225,68 @@ class Fitter:
         # in case we've added to the lookup table, write it out
         if (self.mode == 'SVfit'): s.write_lookup_table()
             
+
+    def fit_numpy(self, s, mask):
+        # same inputs as the FastMTT mode above, fitted for all events at once
+        idx = np.arange(s.n_entries)[mask]
+        ll, tt = s.ll[idx], s.tt[idx]
+        m_sv = s.array('m_sv')[idx]
+
+        # if FastMTT, em channel is good-to-go
+        s.mtt_fit[idx[tt == 'em']] = m_sv[tt == 'em']
+        idx, ll, tt = idx[tt != 'em'], ll[tt != 'em'], tt[tt != 'em']
+        if (len(idx) == 0): return
+        get = lambda name: s.array(name)[idx]
+
+        # grab the ll 4-vectors
+        ele_mass, muo_mass = 0.511*10**-3, 0.105
+        lep_mass = np.where(ll == 'ee', ele_mass, muo_mass)
+        l1 = p4(get('pt_1'), get('eta_1'), get('phi_1'), lep_mass)
+        l2 = p4(get('pt_2'), get('eta_2'), get('phi_2'), lep_mass)
+
+        # apply tau ES corrections
+        pt_3, pt_4, m_3, m_4 = get('pt_3'), get('pt_4'), get('m_3'), get('m_4')
+        ES_3, ES_4 = np.ones(len(idx)), np.ones(len(idx))
+        if self.ES_tool is not None:
+            ES_3 = np.where(tt == 'tt', self.ES_tool.getTES(pt_3, get('decayMode_3'),
+                                                            get('gen_match_3')), 1.)
+            ES_4 = self.ES_tool.getTES(pt_4, get('decayMode_4'), get('gen_match_4'))
+        t1 = ES_3*p4(pt_3, get('eta_3'), get('phi_3'), m_3)
+        t2 = ES_4*p4(pt_4, get('eta_4'), get('phi_4'), m_4)
+
+        # store raw 4l mass
+        s.m4l[idx] = mass(l1 + l2 + t1 + t2)
+
+        # visible legs as given to the C++ fit: leptons at their PDG masses
+        hadronic_1 = (tt == 'tt')
+        m_leg1 = np.where(hadronic_1, ES_3*m_3,
+                          np.where(tt == 'mt', muo_mass, ele_mass))
+        vis_1 = p4(ES_3*pt_3, get('eta_3'), get('phi_3'), m_leg1)
+        vis_2 = p4(ES_4*pt_4, get('eta_4'), get('phi_4'), ES_4*m_4)
+
+        # grab MET info
+        met, metphi = get('met'), get('metphi')
+        cov = np.stack([np.stack([get('metcov00'), get('metcov01')], axis=-1),
+                        np.stack([get('metcov10'), get('metcov11')], axis=-1)], axis=-2)
+        tt_p4 = fast_mtt(vis_1, vis_2, hadronic_1, np.ones(len(idx), dtype=bool),
+                         met*np.cos(metphi), met*np.sin(metphi), cov,
+                         n_grid=self.n_grid, batch_size=self.batch_size)
+        s.mtt_fit[idx] = mass(tt_p4)
+
+def validate_fast_mtt(s, mask=None, ES_tool=None, reference='FastMTT',
+                      rel_tolerance=0.05, min_fraction=0.95):
+    # fit a loaded sample with the numpy FastMTT and compare with the C++
+    # FastMTT (needs ROOT) or with the m_sv stored in the ntuple, which is
+    # fitted without the tau ES; em events take m_sv and are left out
+    if mask is None: mask = s.mask
+    if (reference == 'FastMTT'):
+        Fitter('FastMTT', ES_tool=ES_tool).fit(s, mask=mask)
+        mtt_reference = s.mtt_fit.copy()
+    elif (reference == 'm_sv'):
+        ES_tool, mtt_reference = None, s.array('m_sv')
+    else:
+        raise ValueError("{0} is not a valid FastMTT reference (please use 'FastMTT' "
+                         "or 'm_sv')".format(reference))
+    Fitter('FastMTT_numpy', ES_tool=ES_tool, experimental=True).fit(s, mask=mask)
+    fitted = mask & (s.tt != 'em')
+    return compare(mtt_reference[fitted], s.mtt_fit[fitted], rel_tolerance, min_fraction)
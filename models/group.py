@@ -1,28 +1,40 @@
-import sys
+import glob
 import uproot
 import numpy as np
 import yaml
 from tqdm import tqdm
-import ROOT
 import boost_histogram as bh
 
 from .fitter import Fitter
 from .sample import Sample
+from .bootstrap import poisson_weights
+from .selection import BITS, PRESELECTION, compile_expression, evaluate
+from .expressions import Expression, share_subexpressions
 
-sys.path.append("../../TauPOG/TauIDSFs/python/")
-from TauIDSFTool import TauIDSFTool
-from TauIDSFTool import TauESTool
-import ScaleFactor as SF
-import fakeFactor2
 
 class Group(object):
-    def __init__(self, categories, antiJet_SF, antiEle_SF, antiMu_SF, fitter=None):
+    # branches read by the cuts, weights and core hists
+    branches = ['weightPUtrue', 'Generator_weight', 'cat', 'q_3', 'q_4', 'nbtag',
+                'iso_1', 'iso_2', 'iso_3', 'iso_4', 'isGlobal_1', 'isGlobal_2',
+                'isGlobal_3', 'isGlobal_4', 'isTracker_2', 'isTracker_3',
+                'isTracker_4', 'Electron_mvaFall17V2noIso_WP90_1',
+                'Electron_mvaFall17V2noIso_WP90_2', 'Electron_mvaFall17V2noIso_WP90_3',
+                'idDeepTau2017v2p1VSjet_3', 'idDeepTau2017v2p1VSjet_4',
+                'idDeepTau2017v2p1VSmu_3', 'idDeepTau2017v2p1VSmu_4',
+                'idDeepTau2017v2p1VSe_3', 'idDeepTau2017v2p1VSe_4',
+                'gen_match_3', 'gen_match_4', 'pt_3', 'pt_4', 'eta_3', 'eta_4',
+                'm_sv']
+
+    def __init__(self, categories, antiJet_SF, antiEle_SF, antiMu_SF, fitter=None,
+                 prefetcher=None, trigger_SFs=None):
         self.categories = categories
         self.antiJet_SF = antiJet_SF
         self.antiEle_SF = antiEle_SF
         self.antiMu_SF = antiMu_SF
+        self.trigger_SFs = trigger_SFs
         self.samples = {}
         self.fitter = fitter
+        self.prefetcher = prefetcher
         
         # mtt: fitted di-tau mass
         self.mtt_fit_hists  = {cat:bh.Histogram(bh.axis.Regular(10, 0, 200)) 
@@ -48,18 +60,84 @@ class Group(object):
                       "mA" : self.mA_hists, "mA_c" : self.mA_c_hists,
                       "LT" : self.LT_hists, "ESratio" : self.ESratio_hists, 
                       "cutflow" : self.cutflow_hists}
-        self.hists_from_ntuple = []
+        self.expressions = {"LT" : Expression("pt_3 + pt_4")}
+        self.n_bootstrap = 0
+        self.bootstrap_vars = []
+        self.mtt_window = (90, 180)
+        self.scan_hists = {}
+        self.regions = {}
+        self.region_hists = []
+        self.selection_dir = None
 
     def get_hists(self, cat=None):
         if cat: return {name:hist[cat] for name, hist in self.hists.items()}
         else: return self.hists
 
-    def add_hist(self, var, nbins, low, high, from_ntuple=True):
+    def add_hist(self, var, nbins, low, high, from_ntuple=True, expression=None):
+        # hists from the ntuple are filled with a branch or with an expression
+        # of branches and internal arrays, e.g. "abs(eta_3 - eta_4)"
         new_hists = {cat:bh.Histogram(bh.axis.Regular(nbins, low, high))
                      for cat in self.categories.values()}
         self.hists[var] = new_hists
-        if (from_ntuple): self.hists_from_ntuple.append(var)
+        if (from_ntuple):
+            self.expressions[var] = Expression(expression or var)
+            share_subexpressions(list(self.expressions.values()))
        
+    def add_bootstrap_hists(self, n_replicas, variables=('mA', 'mA_c')):
+        # Poisson-bootstrap replicas of each variable along a second axis
+        self.n_bootstrap = n_replicas
+        self.bootstrap_vars = list(variables)
+        replica_axis = bh.axis.Integer(0, n_replicas, underflow=False, overflow=False)
+        for var in variables:
+            self.hists["{0}_bootstrap".format(var)] = {
+                cat:bh.Histogram(hist.axes[0], replica_axis)
+                for cat, hist in self.hists[var].items()}
+
+    def add_region(self, name, expression, variables=('mtt_fit', 'm4l', 'mA', 'mA_c')):
+        # alternative selection filled in the same pass, e.g. "OS & ~tight1"
+        self.regions[name] = compile_expression("{0} & ({1})".format(PRESELECTION, expression))
+        for var in variables:
+            region_var = "{0}_{1}".format(var, name)
+            self.hists[region_var] = {cat:bh.Histogram(hist.axes[0])
+                                      for cat, hist in self.hists[var].items()}
+            self.region_hists.append(region_var)
+
+    def add_scan_hists(self, target='mA'):
+        # fine (scan variable x category x target mass) hists for cut scans
+        self.scan_target = target
+        cat_axis = bh.axis.StrCategory(list(self.categories.values()))
+        target_axis = self.hists[target][self.categories[1]].axes[0]
+        self.scan_hists = {'LT' : bh.Histogram(bh.axis.Regular(100, 0, 200),
+                                               cat_axis, target_axis),
+                           'mtt_fit' : bh.Histogram(bh.axis.Regular(60, 0, 300),
+                                                    cat_axis, target_axis)}
+
+    def reset_hists(self):
+        for hists_per_cat in self.hists.values():
+            for hist in hists_per_cat.values(): hist.reset()
+
+    def get_samples(self, names=None):
+        if names is None: return list(self.samples.items())
+        return [(name, self.samples[name]) for name in names]
+
+    def get_branches(self):
+        branches = self.branches + [branch for expression in self.expressions.values()
+                                    for branch in expression.branches]
+        if self.fitter is not None: branches = branches + self.fitter.branches
+        if self.n_bootstrap > 0: branches = branches + ['run', 'lumi', 'evt']
+        if self.trigger_SFs: branches = branches + ['pt_1', 'eta_1']
+        return list(dict.fromkeys(branches))
+
+    def prefetched(self, samples):
+        # read ahead the next sample while the current one is processed
+        for i, (name, sample) in enumerate(samples):
+            if self.prefetcher is not None:
+                for _, s in samples[i:i+2]:
+                    self.prefetcher.prefetch(s, self.get_branches())
+            try: yield name, sample
+            finally:
+                if self.prefetcher is not None: self.prefetcher.release(sample)
+
     def add_sample(self, sample):
         if (sample.n_entries == 0):
             print("WARNING: {0} has {1} entries"
@@ -68,34 +146,96 @@ class Group(object):
 
     def reweight_samples(self, factor):
         for sample in self.samples.values():
-            sample.weights *= factor
+            sample.sample_weight *= factor
 
-    def fill_cutflow(self, fill_value, sample):
-        for cat in self.categories.values():
-            good_evts = (sample.cats == cat) & sample.mask
-            to_fill = np.ones(np.count_nonzero(good_evts)) * fill_value
-            self.cutflow_hists[cat].fill(to_fill, weight=sample.weights[good_evts])
+    def mark_cutflow(self, fill_value, sample):
+        # the cutflow bin is filled at the end, with the weights of this stage
+        sample.cutflow_stages[int(fill_value)] = len(sample.cutflow_weights)
+
+    def checkpoint_cutflow(self, sample):
+        # keep the weights of the stages marked so far before changing them
+        if len(sample.cutflow_weights) in sample.cutflow_stages.values():
+            sample.cutflow_weights.append(sample.weights.copy())
+
+    def apply_cut(self, sample, to_cut, fill_value, selection=None):
+        sample.cut_stage[to_cut & sample.mask] = int(fill_value)
+        sample.mask &= ~to_cut
+        if selection is not None: self.record_selection(sample, selection, to_cut)
+
+    def record_selection(self, sample, selection, failed):
+        sample.selection[failed] &= ~BITS[selection]
+
+    def active_mask(self, sample):
+        # events passing the nominal selection or any of the regions, and the
+        # whole preselection when the selections are saved for refilling
+        mask = sample.mask.copy()
+        if (self.selection_dir is not None):
+            mask |= evaluate(sample.selection, PRESELECTION)
+        for region in self.regions.values(): mask |= evaluate(sample.selection, region)
+        return mask
+
+    def fit(self, sample):
+        # masses (and tau SFs, see add_SFs) exist only for these events
+        sample.fitted = self.active_mask(sample)
+        self.fitter.fit(sample, mask=sample.fitted)
+
+    def save_selection(self, sample):
+        if self.selection_dir is not None: sample.write_selection(self.selection_dir)
+
+    def fill_cutflow(self, sample):
+        # an event rejected at stage s counts in all marked stages before s
+        cats = list(self.categories.keys())
+        for version in set(sample.cutflow_stages.values()):
+            if (version < len(sample.cutflow_weights)):
+                weights = sample.cutflow_weights[version]
+            else: weights = sample.weights
+            rejected = bh.Histogram(bh.axis.IntCategory(cats),
+                                    bh.axis.Integer(0, 256, underflow=False,
+                                                    overflow=False))
+            rejected.fill(sample.cat_ids, sample.cut_stage, weight=weights)
+            passed = np.cumsum(rejected.view()[:, ::-1], axis=1)[:, ::-1]
+
+            stages = np.array([stage for stage, v in sample.cutflow_stages.items()
+                               if v == version])
+            for i, cat in enumerate(cats):
+                self.cutflow_hists[self.categories[cat]].fill(
+                    stages + 0.5, weight=passed[i, stages + 1])
+
+    def record_selections(self, sample):
+        # the bits of the tight cuts, recorded without cutting when they are off
+        self.get_signs(sample)
+        self.record_selection(sample, 'btag', self.get_btagged(sample))
+        self.record_selection(sample, 'lepton', self.get_loose_leptons(sample))
+        self.get_tight_taus(sample)
+
+    def get_signs(self, sample):
+        q_3, q_4 = sample.array('q_3'), sample.array('q_4')
+        signs = q_3 * q_4
+        self.record_selection(sample, 'OS', signs > 0)
+        self.record_selection(sample, 'SS', signs < 0)
+        return signs
 
     def sign_cut(self, sample, sign, fill_value):
-        q_3, q_4 = sample.events.array('q_3'), sample.events.array('q_4')
-        signs = np.dot(q_3, q_4)
-        if (sign == 'SS'): sample.mask[signs < 0] = False
-        elif (sign == 'OS'): sample.mask[signs > 0] = False
-        self.fill_cutflow(fill_value, sample)
+        signs = self.get_signs(sample)
+        if (sign == 'SS'): self.apply_cut(sample, signs < 0, fill_value)
+        elif (sign == 'OS'): self.apply_cut(sample, signs > 0, fill_value)
+        self.mark_cutflow(fill_value, sample)
+
+    def get_btagged(self, sample):
+        nbtag = sample.array('nbtag')
+        try: return (nbtag[:,0] > 0)
+        except: return (nbtag > 0)
 
     def btag_cut(self, sample, fill_value):
-        nbtag = sample.events.array('nbtag')
-        try: condition = (nbtag[:,0] > 0)
-        except: condition = (nbtag > 0)
-        sample.mask[condition] = False
-        self.fill_cutflow(fill_value, sample)
+        self.apply_cut(sample, self.get_btagged(sample), fill_value, selection='btag')
+        self.mark_cutflow(fill_value, sample)
 
-    def lepton_cut(self, s, fill_value):
-        iso_1, iso_2 = s.events.array('iso_1'), s.events.array('iso_2')
-        global_1, global_2 = s.events.array('isGlobal_1'), s.events.array('isGlobal_2')
-        tracker_1, tracker_2 = s.events.array('isTracker_2'), s.events.array('isTracker_2')
-        disc_1 = s.events.array('Electron_mvaFall17V2noIso_WP90_1')
-        disc_2 = s.events.array('Electron_mvaFall17V2noIso_WP90_2')
+    def get_loose_leptons(self, s):
+        iso_1, iso_2 = s.array('iso_1'), s.array('iso_2')
+        global_1, global_2 = s.array('isGlobal_1'), s.array('isGlobal_2')
+        tracker_1, tracker_2 = s.array('isTracker_2'), s.array('isTracker_2')
+        disc_1 = s.array('Electron_mvaFall17V2noIso_WP90_1')
+        disc_2 = s.array('Electron_mvaFall17V2noIso_WP90_2')
 
         # tight muon selections
         mm_iso = (iso_1 > 0.2) | (iso_2 > 0.2)
@@ -109,24 +249,26 @@ class Group(object):
         # tight electron selections
         ee_iso = (iso_1 > 0.15) | (iso_2 > 0.15)
         ee_selections = (ee_iso | (disc_1 < 1) | (disc_2 < 1)) & (s.ll == 'ee')
+        return ee_selections | mm_selections
 
-        s.mask[(ee_selections | mm_selections)] = False
-        self.fill_cutflow(fill_value, s)
+    def lepton_cut(self, s, fill_value):
+        self.apply_cut(s, self.get_loose_leptons(s), fill_value, selection='lepton')
+        self.mark_cutflow(fill_value, s)
 
     def get_tight_taus(self, sample):
-        iso_3     = sample.events.array('iso_3')
-        iso_4     = sample.events.array('iso_4')
-        vsJet_3   = sample.events.array('idDeepTau2017v2p1VSjet_3') 
-        vsJet_4   = sample.events.array('idDeepTau2017v2p1VSjet_4')
-        vsMu_3    = sample.events.array('idDeepTau2017v2p1VSmu_3')
-        vsMu_4    = sample.events.array('idDeepTau2017v2p1VSmu_4')
-        vsEle_3   = sample.events.array('idDeepTau2017v2p1VSe_3')
-        vsEle_4   = sample.events.array('idDeepTau2017v2p1VSe_4')
-        global_3  = sample.events.array('isGlobal_3')
-        global_4  = sample.events.array('isGlobal_4')
-        tracker_3 = sample.events.array('isTracker_3')
-        tracker_4 = sample.events.array('isTracker_4')
-        disc_3    = sample.events.array('Electron_mvaFall17V2noIso_WP90_3')
+        iso_3     = sample.array('iso_3')
+        iso_4     = sample.array('iso_4')
+        vsJet_3   = sample.array('idDeepTau2017v2p1VSjet_3') 
+        vsJet_4   = sample.array('idDeepTau2017v2p1VSjet_4')
+        vsMu_3    = sample.array('idDeepTau2017v2p1VSmu_3')
+        vsMu_4    = sample.array('idDeepTau2017v2p1VSmu_4')
+        vsEle_3   = sample.array('idDeepTau2017v2p1VSe_3')
+        vsEle_4   = sample.array('idDeepTau2017v2p1VSe_4')
+        global_3  = sample.array('isGlobal_3')
+        global_4  = sample.array('isGlobal_4')
+        tracker_3 = sample.array('isTracker_3')
+        tracker_4 = sample.array('isTracker_4')
+        disc_3    = sample.array('Electron_mvaFall17V2noIso_WP90_3')
 
         # tight em selections
         em_tight1 = (sample.tt == 'em') & (iso_3 < 0.15) & (disc_3 > 0)
@@ -146,39 +288,42 @@ class Group(object):
 
         tight1 = em_tight1 | mt_tight1 | et_tight1 | tt_tight1
         tight2 = em_tight2 | mt_tight2 | et_tight2 | tt_tight2
+        self.record_selection(sample, 'tight1', ~tight1)
+        self.record_selection(sample, 'tight2', ~tight2)
         return tight1, tight2
 
     def tau_cut(self, sample, tight1, tight2, fill_value=0):
         tight = tight1 & tight2       
-        not_tight = np.array([not t for t in tight], dtype=bool)
-        sample.mask[not_tight] = False
-        self.fill_cutflow(fill_value, sample)
+        self.apply_cut(sample, ~tight, fill_value)
+        self.mark_cutflow(fill_value, sample)
         return tight1, tight2
 
     def data_driven_cut(self, sample, fill_value):
         
         # match arrays contain <e,mu,tau>_genPartFlav variables
-        match_3 = sample.events.array('gen_match_3')
-        match_4 = sample.events.array('gen_match_4')
+        match_3 = sample.array('gen_match_3')
+        match_4 = sample.array('gen_match_4')
 
         # cut if electron/muon from prompt tau
         em_cut = (sample.tt == 'em') & ((match_4 == 15) | (match_3 == 15))
         
         # cut if (electron/muon from prompt tau) | (unmatched/jet-faked tau) 
         et_mt_cut = ((sample.tt == 'et') | (sample.tt == 'mt')) & ((match_3 == 15) | (match_4 > 5))
-        sample.mask[et_mt_cut | em_cut] = False
+        self.apply_cut(sample, et_mt_cut | em_cut, fill_value, selection='data_driven')
 
         # cut if either tau unmatched/jet-faked
-        sample.mask[(sample.tt == 'tt') & ((match_3 > 5) | (match_4 > 5))] = False
-        self.fill_cutflow(fill_value, sample)
+        self.apply_cut(sample, (sample.tt == 'tt') & ((match_3 > 5) | (match_4 > 5)),
+                       fill_value, selection='data_driven')
+        self.mark_cutflow(fill_value, sample)
         
     def add_SFs(self, sample):
-        pt_3, pt_4 = sample.events.array('pt_3'), sample.events.array('pt_4')
-        eta_3, eta_4 = sample.events.array('eta_3'), sample.events.array('eta_4')
-        match_3 = sample.events.array('gen_match_3')
-        match_4 = sample.events.array('gen_match_4')
+        pt_3, pt_4 = sample.array('pt_3'), sample.array('pt_4')
+        eta_3, eta_4 = sample.array('eta_3'), sample.array('eta_4')
+        match_3 = sample.array('gen_match_3')
+        match_4 = sample.array('gen_match_4')
+        self.checkpoint_cutflow(sample)
 
-        for i in np.arange(sample.n_entries)[sample.mask]:
+        for i in np.arange(sample.n_entries)[self.active_mask(sample)]:
             if (sample.tt[i] == 'et' or sample.tt[i] == 'mt'):
 
                 # tau_4: prompt electron or tau decay electron
@@ -205,30 +350,94 @@ class Group(object):
                 if (match_4[i] == 2 or match_4[i] == 4):
                     sample.weights[i] *= self.antiMu_SF.getSFvsEta(eta_4[i], match_4[i])
             
+    def add_trigger_SFs(self, sample):
+        # data/MC trigger weights for the leading ee/mm leg
+        pt_1, eta_1 = sample.array('pt_1'), sample.array('eta_1')
+        for ll, trigger_SF in self.trigger_SFs.items():
+            leg = (sample.ll == ll)
+            sample.weights[leg] *= trigger_SF.get_SF(pt_1[leg], eta_1[leg])
+
     def H_LT_cut(self, LT_cut, sample, fill_value):
-        pt_3, pt_4 = sample.events.array('pt_4'), sample.events.array('pt_3')
+        pt_3, pt_4 = sample.array('pt_4'), sample.array('pt_3')
         to_cut = ((pt_3 + pt_4) < LT_cut) & (sample.tt == 'tt')
-        sample.mask[to_cut] = False
-        self.fill_cutflow(fill_value, sample)
+        self.apply_cut(sample, to_cut, fill_value, selection='LT')
+        self.mark_cutflow(fill_value, sample)
         
     def mtt_fit_cut(self, sample, fill_value):
-        mtt_low = (sample.mtt_fit < 90)
-        mtt_high = (sample.mtt_fit > 180)
+        mtt_low = (sample.mtt_fit < self.mtt_window[0])
+        mtt_high = (sample.mtt_fit > self.mtt_window[1])
         out_of_range = (mtt_low) | (mtt_high)
-        for i in range(100):
-            print(sample.mtt_fit[i], mtt_low[i], mtt_high[i], out_of_range[i])
-        
-        sample.mask[out_of_range] = False
-        self.fill_cutflow(fill_value, sample)
+        self.apply_cut(sample, out_of_range, fill_value)
+        self.record_selection(sample, 'mtt', out_of_range & sample.fitted)
+        self.mark_cutflow(fill_value, sample)
+
+    def fill_scan_hists(self, sample, LT_cut):
+        # the LT cut only acts on tt events, the others go to the overflow
+        LT = sample.array('pt_3') + sample.array('pt_4')
+        LT = np.where(sample.tt == 'tt', LT, np.inf)
+        in_window = ((sample.mtt_fit >= self.mtt_window[0]) &
+                     (sample.mtt_fit <= self.mtt_window[1]))
+        target = getattr(sample, self.scan_target)
+
+        good_evts = sample.mask & in_window
+        self.scan_hists['LT'].fill(LT[good_evts], sample.cats[good_evts],
+                                   target[good_evts], weight=sample.weights[good_evts])
+        good_evts = sample.mask & (LT >= LT_cut)
+        self.scan_hists['mtt_fit'].fill(sample.mtt_fit[good_evts], sample.cats[good_evts],
+                                        target[good_evts], weight=sample.weights[good_evts])
+
+    def fill_bootstrap_hists(self, sample, good_evts, weights, cat):
+        n = self.n_bootstrap
+        replica_weights = poisson_weights(sample.array('run')[good_evts],
+                                          sample.array('lumi')[good_evts],
+                                          sample.array('evt')[good_evts], n)
+        replica_weights = (weights[:, None] * replica_weights).ravel()
+        replicas = np.tile(np.arange(n), np.count_nonzero(good_evts))
+        for var in self.bootstrap_vars:
+            values = np.repeat(getattr(sample, var)[good_evts], n)
+            self.hists["{0}_bootstrap".format(var)][cat].fill(
+                values, replicas, weight=replica_weights)
+
+    def fill_regions(self, sample, blind=False):
+        mtt_fit_old = sample.array('m_sv') if blind else None
+        for name, region in self.regions.items():
+            in_region = evaluate(sample.selection, region)
+            unfitted = np.sum(in_region & ~sample.fitted)
+            if (unfitted > 0):
+                raise ValueError("region {0} selects {1} events of {2} without fitted "
+                                 "masses, rerun to save the selections again"
+                                 .format(name, unfitted, sample.name))
+            if (blind): in_region &= (mtt_fit_old < 80.) | (mtt_fit_old > 140.)
+            for cat in self.categories.values():
+                good_evts = (sample.cats == cat) & in_region
+                weights = sample.weights[good_evts]
+                for var in ['mtt_fit', 'm4l', 'mA', 'mA_c']:
+                    region_var = "{0}_{1}".format(var, name)
+                    if region_var not in self.hists: continue
+                    self.hists[region_var][cat].fill(getattr(sample, var)[good_evts],
+                                                     weight=weights)
+
+    def fill_saved_regions(self, selection_dir, blind=False):
+        # refill the regions from persisted selections, without reading branches
+        for name, sample in self.samples.items():
+            for path in sorted(glob.glob("{0}/{1}_selection*.npz"
+                                         .format(selection_dir, name))):
+                sample.read_selection(path, self.categories)
+                self.fill_regions(sample, blind=blind)
 
     def fill_hists(self, sample, blind=False):
+        values = {}
+        for name, expression in self.expressions.items():
+            try: values[name] = expression.evaluate(sample)
+            except KeyError as e:
+                print("Cannot access {0} in sample.events ({1})".format(e, name))
         for cat in self.categories.values():
             good_evts = (sample.cats == cat) & sample.mask
-            weights = sample.weights[good_evts]
 
-            mtt_fit_old = sample.events.array('m_sv')
+            mtt_fit_old = sample.array('m_sv')
             if (blind): good_evts = good_evts & ((mtt_fit_old < 80.) | 
                                                  (mtt_fit_old > 140.))
+            weights = sample.weights[good_evts]
 
             # fit the diTau mass spectrum
             self.mtt_fit_hists[cat].fill(sample.mtt_fit[good_evts], weight=weights)
@@ -237,28 +446,29 @@ class Group(object):
             self.m4l_hists[cat].fill(sample.m4l[good_evts], weight=weights)
             self.mA_hists[cat].fill(sample.mA[good_evts], weight=weights)
             self.mA_c_hists[cat].fill(sample.mA_c[good_evts], weight=weights)
+            if (self.n_bootstrap > 0):
+                self.fill_bootstrap_hists(sample, good_evts, weights, cat)
+
+            # LT and the hists from the ntuple
+            for name, vals in values.items():
+                self.hists[name][cat].fill(vals[good_evts], weight=weights)
+        sample.computed = {}
+        if self.regions: self.fill_regions(sample, blind=blind)
             
-            LT = sample.events.array('pt_3') + sample.events.array('pt_4')
-            self.LT_hists[cat].fill(LT[good_evts], weight=weights)            
-            
-            # fill extra_hists
-            for name, hist in self.hists.items():
-                if (name not in self.hists_from_ntuple): continue
-                try: hist[cat].fill(sample.events.array(name)[good_evts],
-                                    weight=weights)
-                except KeyError: 
-                    print("Cannot access {0} in sample.events".format(name))
-            
-    def process_samples(self, tight_cuts, sign, data_driven, tau_ID_SF, redo_fit, LT_cut):
-        progress_bar= tqdm(self.samples.items())
+    def process_samples(self, tight_cuts, sign, data_driven, tau_ID_SF, redo_fit, LT_cut,
+                        names=None, scan=False):
+        samples = self.get_samples(names)
+        progress_bar= tqdm(self.prefetched(samples), total=len(samples))
         for name, sample in progress_bar:
             if (sample.n_entries < 1): continue
+            sample.load()
             progress_bar.set_description("{0}".format(name.ljust(20)[:20]))
             sample.weights *= sample.sample_weight
-            sample.weights *= sample.events.array('weightPUtrue')
-            sample.weights *= sample.events.array('Generator_weight')
-            sample.parse_categories(self.categories, sample.events.array('cat'))
-            self.fill_cutflow(0.5, sample)
+            sample.weights *= sample.array('weightPUtrue')
+            sample.weights *= sample.array('Generator_weight')
+            sample.parse_categories(self.categories, sample.array('cat'))
+            if self.trigger_SFs: self.add_trigger_SFs(sample)
+            self.mark_cutflow(0.5, sample)
 
             if (tight_cuts):
                 self.sign_cut(sample, sign, fill_value=1.5)
@@ -266,12 +476,22 @@ class Group(object):
                 self.lepton_cut(sample, fill_value=3.5)
                 tight1, tight2 = self.get_tight_taus(sample)
                 self.tau_cut(sample, tight1, tight2, fill_value=4.5)
+            else: self.record_selections(sample)
 
             if (data_driven):
                 self.data_driven_cut(sample, fill_value=5.5)
                 if tau_ID_SF: self.add_SFs(sample)
 
+            # in scan mode, stop before the scanned LT and mtt_fit cuts
+            if (scan):
+                self.fit(sample)
+                self.fill_scan_hists(sample, LT_cut)
+                self.fill_cutflow(sample)
+                continue
+
             self.H_LT_cut(LT_cut, sample, fill_value=6.5)
-            self.fitter.fit(sample)
+            self.fit(sample)
             self.mtt_fit_cut(sample, fill_value=7.5)
             self.fill_hists(sample, blind=False)
+            self.fill_cutflow(sample)
+            self.save_selection(sample)
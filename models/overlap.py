@@ -0,0 +1,50 @@
+import numpy as np
+
+# evt is unique within a run, so (run, evt) identifies an event and the
+# lumi section does not need to be part of the key
+RUN_BITS, EVT_BITS = 20, 44
+
+def event_keys(run, evt):
+    run = np.asarray(run).astype(np.uint64)
+    evt = np.asarray(evt).astype(np.uint64)
+    if (len(run) and (run.max() >> np.uint64(RUN_BITS) or
+                      evt.max() >> np.uint64(EVT_BITS))):
+        raise ValueError("run/evt numbers do not fit into a packed event key")
+    return (run << np.uint64(EVT_BITS)) | evt
+
+def find_duplicates(keys):
+    # keys: one array per dataset, in priority order; returns the indices of
+    # the events already present in a dataset of higher priority (or earlier
+    # in the same dataset) with one stable sort over all events
+    sizes = [len(k) for k in keys]
+    all_keys = np.concatenate(keys)
+    rank = np.repeat(np.arange(len(keys), dtype=np.uint16), sizes)
+    order = np.lexsort((rank, all_keys))
+    sorted_keys = all_keys[order]
+    duplicate = np.zeros(len(order), dtype=bool)
+    duplicate[1:] = (sorted_keys[1:] == sorted_keys[:-1])
+    dropped = np.sort(order[duplicate])
+
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    bounds = np.searchsorted(dropped, offsets)
+    return [dropped[bounds[i]:bounds[i+1]] - offsets[i] for i in range(len(keys))]
+
+class EventIndex(object):
+    # sorted index of the keys seen so far, filled chunk by chunk so that only
+    # the index (8 bytes per unique event) has to stay in memory
+    def __init__(self):
+        self.keys = np.array([], dtype=np.uint64)
+
+    def add(self, keys):
+        # returns the positions of keys seen before (in the index or the chunk);
+        # only the chunk is sorted, its new keys are inserted into the index
+        # with one linear copy
+        unique, first = np.unique(keys, return_index=True)
+        i = np.searchsorted(self.keys, unique)
+        inside = (i < len(self.keys))
+        known = np.zeros(len(unique), dtype=bool)
+        known[inside] = (self.keys[i[inside]] == unique[inside])
+        duplicate = np.ones(len(keys), dtype=bool)
+        duplicate[first[~known]] = False
+        self.keys = np.insert(self.keys, i[~known], unique[~known])
+        return np.where(duplicate)[0]
@@ -0,0 +1,46 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# reads the branches of upcoming samples in background threads, so that
+# I/O and decompression overlap with the cuts and fits of the current sample
+class Prefetcher(object):
+    def __init__(self, max_bytes=2*1024**3, n_threads=4):
+        self.max_bytes = max_bytes
+        self.pool = ThreadPoolExecutor(max_workers=n_threads)
+        self.lock = threading.Lock()
+        self.reserved = {}
+        self.used = 0
+
+    def prefetch(self, sample, branches):
+        if (sample.n_entries < 1 or id(sample) in self.reserved): return
+        self.reserved[id(sample)] = 0
+
+        # open the tree here, so that the pool threads do not race to open it
+        sample.events
+        for name in branches:
+            if (name in sample.cache or name not in sample.branches): continue
+
+            # budget 8 bytes per entry until the actual size is known
+            n_bytes = 8*sample.n_entries
+            with self.lock:
+                if (self.used + n_bytes > self.max_bytes): break
+                self.used += n_bytes
+                self.reserved[id(sample)] += n_bytes
+            sample.cache[name] = self.pool.submit(self.read, sample, name, n_bytes)
+
+    def read(self, sample, name, n_bytes):
+        array = sample.read_array(name)
+        with self.lock:
+            if id(sample) in self.reserved:
+                self.used += array.nbytes - n_bytes
+                self.reserved[id(sample)] += array.nbytes - n_bytes
+        return array
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+    def release(self, sample):
+        for future in sample.cache.values(): future.cancel()
+        sample.cache = {}
+        with self.lock:
+            self.used -= self.reserved.pop(id(sample), 0)
@@ -1,46 +1,42 @@
-import sys
 import uproot
 import numpy as np
 from tqdm import tqdm
-import ROOT
 import boost_histogram as bh
 
 from .fitter import Fitter
 from .sample import Sample
 from .group  import Group
-sys.path.append("../../TauPOG/TauIDSFs/python/")
-from TauIDSFTool import TauIDSFTool
-from TauIDSFTool import TauESTool
-import ScaleFactor as SF
+from .stitching import Stitcher, NJET_FAMILIES
 
 class Reducible(Group):
-    def __init__(self, categories, antiJet_SF, antiEle_SF, antiMu_SF, fitter=None):
-        Group.__init__(self, categories, antiJet_SF, antiEle_SF, antiMu_SF, fitter)
+    def __init__(self, categories, antiJet_SF, antiEle_SF, antiMu_SF, fitter=None,
+                 prefetcher=None, trigger_SFs=None):
+        Group.__init__(self, categories, antiJet_SF, antiEle_SF, antiMu_SF, fitter,
+                       prefetcher, trigger_SFs)
+        self.stitcher = None
 
-    def reweight_nJets(self, lumi):
-        for i in range(1, 5):
-            DYnJets = "DY{0:d}JetsToLL".format(i)
-            norm_1 = self.samples['DYJetsToLL'].total_weight/self.samples['DYJetsToLL'].x_sec
-            norm_2 = self.samples[DYnJets].total_weight/self.samples[DYnJets].x_sec
-            self.samples[DYnJets].sample_weight = lumi/(norm_1 + norm_2)
+    def get_branches(self):
+        branches = Group.get_branches(self)
+        if self.stitcher is not None: branches += self.stitcher.get_variables()
+        return list(dict.fromkeys(branches))
 
-        for i in range(1, 4):
-            WnJets = "W{0:d}JetsToLNu".format(i)
-            norm_1 = self.samples['WJetsToLNu'].total_weight/self.samples['WJetsToLNu'].x_sec
-            norm_2 = self.samples[WnJets].total_weight/self.samples[WnJets].x_sec
-            self.samples[WnJets].sample_weight = lumi/(norm_1 + norm_2)
+    def stitch_samples(self, lumi, families=NJET_FAMILIES):
+        self.stitcher = Stitcher(self.samples, lumi, families)
 
-    def process_samples(self, tight_cuts, sign, data_driven, tau_ID_SF, redo_fit, LT_cut):
-        progress_bar= tqdm(self.samples.items())
+    def process_samples(self, tight_cuts, sign, data_driven, tau_ID_SF, redo_fit, LT_cut,
+                        names=None, scan=False):
+        samples = self.get_samples(names)
+        progress_bar= tqdm(self.prefetched(samples), total=len(samples))
         for name, sample in progress_bar:
             if (sample.n_entries < 1): continue
+            sample.load()
             progress_bar.set_description("{0}".format(name.ljust(20)[:20]))
-            if (name == "DYJetsToLL" or name == "WJetsToLNu"):
-                self.reweight_nJet_events(sample, sample.events.array('LHE_Njets'))
-            sample.weights *= sample.events.array('weightPUtrue')
-            sample.weights *= sample.events.array('Generator_weight')
-            sample.parse_categories(self.categories, sample.events.array('cat'))
-            self.fill_cutflow(0.5, sample)
+            if self.stitcher is not None: self.stitcher.apply(sample)
+            sample.weights *= sample.array('weightPUtrue')
+            sample.weights *= sample.array('Generator_weight')
+            sample.parse_categories(self.categories, sample.array('cat'))
+            if self.trigger_SFs: self.add_trigger_SFs(sample)
+            self.mark_cutflow(0.5, sample)
 
             if (tight_cuts):
                 self.sign_cut(sample, sign, fill_value=1.5)
@@ -48,32 +44,32 @@ class Reducible(Group):
                 self.lepton_cut(sample, fill_value=3.5)
                 tight1, tight2 = self.get_tight_taus(sample)
                 self.tau_cut(sample, tight1, tight2, fill_value=4.5)
+            else: self.record_selections(sample)
 
             if (data_driven):
                 self.data_driven_cut(sample, fill_value=5.5)
-                match_3 = sample.events.array('gen_match_3')
-                match_4 = sample.events.array('gen_match_4')
+                match_3 = sample.array('gen_match_3')
+                match_4 = sample.array('gen_match_4')
                 
                 # tau_4: must be real tau
-                sample.mask[((sample.tt == 'et') | (sample.tt == 'mt'))
-                            & match_4 != 5] = False
+                self.apply_cut(sample, ((sample.tt == 'et') | (sample.tt == 'mt'))
+                               & match_4 != 5, fill_value=6.5, selection='data_driven')
                 # tau_3,4: must be real taus
-                sample.mask[(sample.tt == 'tt') & (match_3 != 5) & (match_4 != 5)] = False
+                self.apply_cut(sample, (sample.tt == 'tt') & (match_3 != 5) & (match_4 != 5),
+                               fill_value=6.5, selection='data_driven')
 
                 if tau_ID_SF: self.add_SFs(sample)
 
+            # in scan mode, stop before the scanned LT and mtt_fit cuts
+            if (scan):
+                self.fit(sample)
+                self.fill_scan_hists(sample, LT_cut)
+                self.fill_cutflow(sample)
+                continue
+
             self.H_LT_cut(LT_cut, sample, fill_value=6.5)
-            self.fitter.fit(sample)
+            self.fit(sample)
             self.mtt_fit_cut(sample, fill_value=7.5)
             self.fill_hists(sample)
-
-    def reweight_nJet_events(self, sample, LHE_nJets):
-        for j in np.where(LHE_nJets > 0)[0]:
-            nJets = LHE_nJets[j]
-            if (sample.name == "DYJetsToLL"):
-                DYnJets = "DY{0}JetsToLL".format(nJets)
-                self.samples[sample.name].weights[j] = self.samples[DYnJets].sample_weight
-
-            if (sample.name == "WJetsToLNu"):
-                WnJets = "W{0}JetsToLNu".format(nJets)
-                self.samples[sample.name].weights[j] = self.samples[WnJets].sample_weight
+            self.fill_cutflow(sample)
+            self.save_selection(sample)
@@ -1,10 +1,15 @@
+import os
+import copy
 import uproot
 import pickle
 import numpy as np
 
+from .selection import SELECTIONS, ALL_BITS
+
 class Sample(object):
-    def __init__(self, name, path, x_sec, total_weight, sample_weight, 
-                 lookup_path="../lookup_tables"):
+    def __init__(self, name, path, x_sec, total_weight, sample_weight,
+                 lookup_path="../lookup_tables", catalog=None,
+                 entry_start=0, entry_stop=None, opener=None):
         self.name = name
         self.path = path
         self.x_sec = x_sec
@@ -16,43 +21,140 @@ class Sample(object):
         self.m4l = np.array([])
         self.mA = np.array([])
         self.mA_c = np.array([])
-        self.get_events()
         self.lookup_path = lookup_path
         self.lookup_table = {}
-        try: 
-            lookup_table_file = open("{0}/{1}_masses.pkl"
-                                     .format(lookup_path, self.name), 'rb')
-            self.lookup_table = pickle.load(lookup_table_file)
-            lookup_table_file.close()
-        except: 
-            print("WARNING: creating new lookup table for {0}"
-                  .format(self.name))
+        self.lookup_tag = None
         self.n_recalculated = 0
+        self.duplicates = None
+        self.entry_start = entry_start
+        self.entry_stop = entry_stop
+
+        # file metadata comes from the catalog, the file itself is
+        # only opened once the sample is processed
+        self.info = catalog.get(path) if catalog else None
+        self._events = None
+        self.opener = opener
+        self.loaded = False
 
+        # branches being read ahead of time, see Prefetcher
+        self.cache = {}
+
+    @property
+    def events(self):
+        if (self._events is None): self.get_events()
+        return self._events
+
+    @property
+    def n_total(self):
+        if (self.info is not None): return self.info['entries']
+        return self.events.numentries
+
+    @property
+    def n_entries(self):
+        stop = self.n_total
+        if (self.entry_stop is not None): stop = min(stop, self.entry_stop)
+        return max(stop - self.entry_start, 0)
+
+    @property
+    def branches(self):
+        if (self.info is not None): return self.info['branches']
+        return [b.decode() if isinstance(b, bytes) else b
+                for b in self.events.keys()]
 
     def show(self):
         print("{0} (x_sec = {1:2.2f}, weight = {2:2.2f})"
               .format(self.name, self.x_sec, self.sample_weight))
 
     def get_events(self):
-        try: self.events = uproot.open(self.path)["Events"]
+        try:
+            if (self.opener is not None and self.info is not None):
+                self._events = self.opener(self.path, self.info)
+            else: self._events = uproot.open(self.path)["Events"]
         except AttributeError:
             print("ERROR: failed to open file {0:s}".format(self.path))
-        self.n_entries = self.events.numentries
+
+    def set_range(self, entry_start=0, entry_stop=None):
+        self.entry_start = entry_start
+        self.entry_stop = entry_stop
+        self.loaded = False
+
+    def split(self, entry_start, entry_stop):
+        chunk = copy.copy(self)
+        chunk.set_range(entry_start, entry_stop)
+        chunk.cache = {}
+        chunk.lookup_table = {}
+        return chunk
+
+    def array(self, name):
+        if name in self.cache: return self.cache[name].result()
+        return self.read_array(name)
+
+    def read_array(self, name):
+        return self.events.array(name, entrystart=self.entry_start,
+                                 entrystop=self.entry_stop)
+
+    def load(self):
+        if (self.loaded): return
         self.weights = np.ones(self.n_entries)
         self.mask = np.ones(self.n_entries, dtype=bool)
         self.mtt_fit = np.zeros(self.n_entries)
         self.m4l     = np.zeros(self.n_entries)
         self.mA      = np.zeros(self.n_entries)
         self.mA_c    = np.zeros(self.n_entries)
-        
+
+        # index of the first cut rejecting each event (255: never rejected)
+        self.cut_stage = np.full(self.n_entries, 255, dtype=np.uint8)
+        self.cutflow_stages = {}
+        self.cutflow_weights = []
+
+        # branches and expressions evaluated for the hists, see models/expressions.py
+        self.computed = {}
+
+        # bit-packed pass/fail of each selection, see models/selection.py
+        self.selection = np.full(self.n_entries, ALL_BITS, dtype=np.uint16)
+        # events with fitted masses and tau SFs (the nominal selection and regions)
+        self.fitted = np.zeros(self.n_entries, dtype=bool)
+        try:
+            lookup_table_file = open("{0}/{1}_masses.pkl"
+                                     .format(self.lookup_path, self.name), 'rb')
+            self.lookup_table = pickle.load(lookup_table_file)
+            lookup_table_file.close()
+        except:
+            print("WARNING: creating new lookup table for {0}"
+                  .format(self.name))
+        self.loaded = True
+
     def parse_categories(self, categories, evt_cat_array):
+        self.cat_ids = np.asarray(evt_cat_array).astype(int)
         self.cats = np.array([categories[cat] for cat in evt_cat_array])
         self.ll   = np.array([cat[:2] for cat in self.cats])
         self.tt   = np.array([cat[2:] for cat in self.cats])
 
+    def write_selection(self, outdir):
+        if not os.path.isdir(outdir): os.makedirs(outdir)
+        tag = "_{0}".format(self.lookup_tag) if self.lookup_tag else ""
+        np.savez_compressed("{0}/{1}_selection{2}.npz".format(outdir, self.name, tag),
+                            selections=np.array(SELECTIONS), selection=self.selection,
+                            fitted=self.fitted,
+                            cat_ids=self.cat_ids, weights=self.weights,
+                            mtt_fit=self.mtt_fit, m4l=self.m4l, mA=self.mA, mA_c=self.mA_c)
+
+    def read_selection(self, path, categories):
+        saved = np.load(path)
+        if (list(saved['selections']) != SELECTIONS or 'fitted' not in saved):
+            raise ValueError("{0} was written with selections {1}, please rerun"
+                             .format(path, list(saved['selections'])))
+        self.selection = saved['selection']
+        self.fitted = saved['fitted']
+        self.weights = saved['weights']
+        self.mtt_fit, self.m4l = saved['mtt_fit'], saved['m4l']
+        self.mA, self.mA_c = saved['mA'], saved['mA_c']
+        self.parse_categories(categories, saved['cat_ids'])
+
     def write_lookup_table(self):
-        with open("{0}/{1}_masses.pkl"
-                  .format(self.lookup_path, self.name), 'wb') as f:
+        # partial (sharded) runs write their own table, see merge_lookup_tables
+        tag = "_{0}".format(self.lookup_tag) if self.lookup_tag else ""
+        with open("{0}/{1}_masses{2}.pkl"
+                  .format(self.lookup_path, self.name, tag), 'wb') as f:
             pickle.dump(self.lookup_table, f, protocol=pickle.HIGHEST_PROTOCOL)
             f.close()
@@ -0,0 +1,39 @@
+import os
+import numpy as np
+
+def significance(s, b):
+    # Asimov significance, combined in quadrature over the last two axes
+    # (category x mass); bins without signal or background are skipped
+    good = (s > 0) & (b > 0)
+    s, b = np.where(good, s, 0.0), np.where(good, b, 1.0)
+    z2 = 2*((s + b)*np.log1p(s/b) - s)
+    return np.sqrt(z2.sum(axis=(-2, -1)))
+
+def scan_threshold(signal, background):
+    # yields for every lower threshold on the first axis, from cumulative sums
+    edges = signal.axes[0].edges
+    s = np.cumsum(signal.view(flow=True)[::-1], axis=0)[::-1][1:]
+    b = np.cumsum(background.view(flow=True)[::-1], axis=0)[::-1][1:]
+    z = significance(s, b)
+    return [(edges[i], s[i].sum(), b[i].sum(), z[i]) for i in range(len(edges))]
+
+def scan_window(signal, background):
+    # yields for every [low, high) window on the first axis
+    edges = signal.axes[0].edges
+    s = np.cumsum(signal.view(flow=True), axis=0)
+    b = np.cumsum(background.view(flow=True), axis=0)
+    rows = []
+    for i in range(len(edges)):
+        s_w, b_w = s[i+1:len(edges)] - s[i], b[i+1:len(edges)] - b[i]
+        z = significance(s_w, b_w)
+        for j in range(len(z)):
+            rows.append((edges[i], edges[i+j+1], s_w[j].sum(), b_w[j].sum(), z[j]))
+    return rows
+
+def write_table(path, header, rows):
+    outdir = os.path.dirname(path)
+    if outdir and not os.path.isdir(outdir): os.makedirs(outdir)
+    with open(path, 'w') as f:
+        f.write(",".join(header) + "\n")
+        for row in rows:
+            f.write(",".join("{0:.6g}".format(val) for val in row) + "\n")
@@ -0,0 +1,42 @@
+import ast
+import numpy as np
+
+# one bit per selection, set while an event passes it; stages that have not
+# (yet) run leave their bit set
+SELECTIONS = ['unique', 'OS', 'SS', 'btag', 'lepton', 'tight1', 'tight2',
+              'data_driven', 'LT', 'mtt']
+BITS = {name:np.uint16(1 << i) for i, name in enumerate(SELECTIONS)}
+ALL_BITS = np.uint16((1 << len(SELECTIONS)) - 1)
+
+# regions are selected within the preselection, which is fitted and saved
+# whole when the selections are saved, so regions refilled later can choose
+# any of the remaining bits
+PRESELECTION = "unique & data_driven & LT"
+
+def compile_expression(expression):
+    # bitwise expressions over selection names, e.g. "SS & ~tight1 & tight2"
+    tree = ast.parse(expression, mode='eval').body
+    def check(node):
+        if isinstance(node, ast.Name):
+            if node.id not in BITS:
+                raise ValueError("{0} is not a valid selection (use one of {1})"
+                                 .format(node.id, SELECTIONS))
+        elif isinstance(node, ast.BinOp):
+            if not isinstance(node.op, (ast.BitAnd, ast.BitOr, ast.BitXor)):
+                raise ValueError("invalid operator in '{0}'".format(expression))
+            check(node.left)
+            check(node.right)
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert):
+            check(node.operand)
+        else: raise ValueError("invalid selection expression '{0}'".format(expression))
+    check(tree)
+    return tree
+
+def evaluate(selection, tree):
+    if isinstance(tree, str): tree = compile_expression(tree)
+    if isinstance(tree, ast.Name): return (selection & BITS[tree.id]) != 0
+    if isinstance(tree, ast.UnaryOp): return ~evaluate(selection, tree.operand)
+    left, right = evaluate(selection, tree.left), evaluate(selection, tree.right)
+    if isinstance(tree.op, ast.BitAnd): return left & right
+    if isinstance(tree.op, ast.BitOr): return left | right
+    return left ^ right
@@ -0,0 +1,189 @@
+import os
+import glob
+import pickle
+import socket
+import time
+import threading
+import yaml
+
+# rough per-event processing costs [s], used until a sample has been measured
+IO_COST = 2e-5
+FIT_COST = {'SVfit':5e-3, 'FastMTT':2e-4, 'FastMTT_numpy':2e-5}
+
+def estimate_cost(sample, fitter_mode, costs):
+    if sample.name in costs: return costs[sample.name]
+
+    # SVfit masses are cheap once they are in the lookup table
+    lookup_file = "{0}/{1}_masses.pkl".format(sample.lookup_path, sample.name)
+    if (fitter_mode == 'SVfit' and os.path.isfile(lookup_file)):
+        return IO_COST + FIT_COST['FastMTT']
+    return IO_COST + FIT_COST.get(fitter_mode, 0.0)
+
+def plan_shards(groups, fitter_mode, costs=None, shard_seconds=600.):
+    if costs is None: costs = {}
+    shards = []
+    for group_name, group in groups.items():
+        for name, sample in group.samples.items():
+            if (sample.n_entries < 1): continue
+            cost = estimate_cost(sample, fitter_mode, costs)
+            step = max(int(shard_seconds/cost), 1)
+            starts = list(range(0, sample.n_entries, step))
+
+            # a remainder under half a shard goes into the previous shard
+            if (len(starts) > 1 and sample.n_entries - starts[-1] < step//2): starts.pop()
+            for start, stop in zip(starts, starts[1:] + [sample.n_entries]):
+                shards.append({'group':group_name, 'sample':name,
+                               'start':start, 'stop':stop,
+                               'cost':cost*(stop - start)})
+
+    # hand out the most expensive shards first
+    shards.sort(key=lambda shard: -shard['cost'])
+    for i, shard in enumerate(shards):
+        shard['id'] = "{0:05d}".format(i)
+    return shards
+
+def merge_hists(results):
+    merged = {}
+    for result in results:
+        group = merged.setdefault(result['shard']['group'], {})
+        for var, hists_per_cat in result['hists'].items():
+            if var not in group:
+                group[var] = hists_per_cat
+                continue
+            for cat, hist in hists_per_cat.items():
+                group[var][cat] += hist
+    return merged
+
+def merge_lookup_tables(lookup_path):
+    partial_files = sorted(glob.glob("{0}/*_masses_*.pkl".format(lookup_path)))
+    tables = {}
+    for partial_file in partial_files:
+        name = os.path.basename(partial_file).split('_masses_')[0]
+        if name not in tables:
+            try:
+                with open("{0}/{1}_masses.pkl".format(lookup_path, name), 'rb') as f:
+                    tables[name] = pickle.load(f)
+            except (IOError, EOFError): tables[name] = {}
+        with open(partial_file, 'rb') as f:
+            tables[name].update(pickle.load(f))
+
+    for name, table in tables.items():
+        with open("{0}/{1}_masses.pkl".format(lookup_path, name), 'wb') as f:
+            pickle.dump(table, f, protocol=pickle.HIGHEST_PROTOCOL)
+    for partial_file in partial_files: os.remove(partial_file)
+
+# a directory-based queue of shards, shared by any number of workers;
+# shards move todo -> running -> done/failed via atomic renames, and the
+# mtime of a running shard is its lease, renewed by heartbeat()
+class WorkQueue(object):
+    def __init__(self, path):
+        self.path = path
+        self.dirs = {state:os.path.join(path, state)
+                     for state in ['todo', 'running', 'done', 'failed']}
+
+    def make_dirs(self):
+        for d in self.dirs.values():
+            if not os.path.isdir(d): os.makedirs(d)
+
+    def create(self, shards):
+        self.make_dirs()
+        for d in self.dirs.values():
+            for f in os.listdir(d): os.remove(os.path.join(d, f))
+        for shard in shards:
+            with open(os.path.join(self.dirs['todo'], shard['id'] + '.yaml'), 'w') as f:
+                yaml.dump(shard, f)
+
+    def submit(self, shard):
+        self.make_dirs()
+        shard['id'] = "{0:.6f}_{1}".format(time.time(), os.getpid())
+        todo = os.path.join(self.dirs['todo'], shard['id'] + '.yaml')
+        with open(todo + '.tmp', 'w') as f:
+            yaml.dump(shard, f)
+        os.replace(todo + '.tmp', todo)
+        return shard['id']
+
+    def claim(self):
+        for f in sorted(os.listdir(self.dirs['todo'])):
+            if not f.endswith('.yaml'): continue
+            running = os.path.join(self.dirs['running'], f)
+            try: os.rename(os.path.join(self.dirs['todo'], f), running)
+            except OSError: continue # another worker got there first
+            os.utime(running, None)
+            with open(running) as shard_file:
+                return yaml.safe_load(shard_file)
+        return None
+
+    def complete(self, shard, hists, seconds):
+        result = {'shard':shard, 'hists':hists, 'seconds':seconds,
+                  'worker':"{0}:{1}".format(socket.gethostname(), os.getpid())}
+        done = os.path.join(self.dirs['done'], shard['id'] + '.pkl')
+        with open(done + '.tmp', 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(done + '.tmp', done)
+        # the shard may have been requeued meanwhile; results are keyed by
+        # id, so finishing it twice does not double count
+        try: os.remove(os.path.join(self.dirs['running'], shard['id'] + '.yaml'))
+        except OSError: pass
+
+    def fail(self, shard):
+        f = shard['id'] + '.yaml'
+        try: os.rename(os.path.join(self.dirs['running'], f),
+                       os.path.join(self.dirs['failed'], f))
+        except OSError: pass
+
+    def heartbeat(self, shard, interval=60.):
+        # renew the lease until the returned event is set
+        stop = threading.Event()
+        running = os.path.join(self.dirs['running'], shard['id'] + '.yaml')
+        def beat():
+            while not stop.wait(interval):
+                try: os.utime(running, None)
+                except OSError: return
+        thread = threading.Thread(target=beat)
+        thread.daemon = True
+        thread.start()
+        return stop
+
+    def requeue(self, lease_seconds=600.):
+        # move shards of killed workers (lease expired) and failed shards
+        # back to todo
+        moved = {'running':0, 'failed':0}
+        now = time.time()
+        for state in moved:
+            for f in os.listdir(self.dirs[state]):
+                if not f.endswith('.yaml'): continue
+                path = os.path.join(self.dirs[state], f)
+                try:
+                    if (state == 'running' and
+                        now - os.path.getmtime(path) < lease_seconds): continue
+                    os.rename(path, os.path.join(self.dirs['todo'], f))
+                except OSError: continue # finished or claimed meanwhile
+                moved[state] += 1
+        return moved
+
+    def pending(self):
+        return {state:len(os.listdir(self.dirs[state]))
+                for state in ['todo', 'running', 'failed']}
+
+    def results(self):
+        for done in sorted(glob.glob(os.path.join(self.dirs['done'], '*.pkl'))):
+            with open(done, 'rb') as f:
+                yield pickle.load(f)
+
+    def costs(self):
+        try:
+            with open(os.path.join(self.path, 'costs.yaml')) as f:
+                return yaml.safe_load(f) or {}
+        except IOError: return {}
+
+    def update_costs(self):
+        seconds, entries = {}, {}
+        for result in self.results():
+            name = result['shard']['sample']
+            seconds[name] = seconds.get(name, 0.) + result['seconds']
+            entries[name] = (entries.get(name, 0) + result['shard']['stop']
+                             - result['shard']['start'])
+        costs = self.costs()
+        costs.update({name:float(seconds[name]/entries[name]) for name in seconds})
+        with open(os.path.join(self.path, 'costs.yaml'), 'w') as f:
+            yaml.dump(costs, f)
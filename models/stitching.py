@@ -0,0 +1,55 @@
+import numpy as np
+
+# inclusive samples and their exclusive (here: jet-binned) extensions;
+# bins map the lower edge of each bin in 'variable' to the exclusive sample
+# covering it (None: only the inclusive sample), events below the first edge
+# are only in the inclusive sample and the last edge must close the family
+NJET_FAMILIES = {
+    'DYJetsToLL' : {'variable' : 'LHE_Njets',
+                    'bins' : {1 : 'DY1JetsToLL', 2 : 'DY2JetsToLL',
+                              3 : 'DY3JetsToLL', 4 : 'DY4JetsToLL', 5 : None}},
+    'WJetsToLNu' : {'variable' : 'LHE_Njets',
+                    'bins' : {1 : 'W1JetsToLNu', 2 : 'W2JetsToLNu',
+                              3 : 'W3JetsToLNu', 4 : 'W4JetsToLNu', 5 : None}},
+}
+
+class Stitcher(object):
+    def __init__(self, samples, lumi, families=NJET_FAMILIES):
+        self.families = {}
+        for inclusive, family in families.items():
+            if inclusive not in samples: continue
+            edges = sorted(family['bins'].keys())
+            if (family['bins'][edges[-1]] is not None):
+                raise ValueError("the last bin of {0} ({1}) has no upper edge, close it "
+                                 "with an edge above {2} mapped to None (null in the config)"
+                                 .format(inclusive, family['bins'][edges[-1]], edges[-1]))
+            inc = samples[inclusive]
+
+            # per-bin weights, bin 0 holds the events only the inclusive sample covers
+            weights = np.full(len(edges) + 1, inc.sample_weight)
+            for i, edge in enumerate(edges):
+                name = family['bins'][edge]
+                if name is None: continue
+                if name not in samples:
+                    print("WARNING: {0} missing, stitching {1} without it"
+                          .format(name, inclusive))
+                    continue
+                norm_1 = inc.total_weight/inc.x_sec
+                norm_2 = samples[name].total_weight/samples[name].x_sec
+                weights[i+1] = lumi/(norm_1 + norm_2)
+                samples[name].sample_weight = weights[i+1]
+
+            self.families[inclusive] = {'variable' : family['variable'],
+                                        'edges' : np.array(edges, dtype=float),
+                                        'weights' : weights}
+
+    def get_variables(self):
+        return [family['variable'] for family in self.families.values()]
+
+    def apply(self, sample):
+        if sample.name not in self.families:
+            sample.weights *= sample.sample_weight
+            return
+        family = self.families[sample.name]
+        bins = np.digitize(sample.array(family['variable']), family['edges'])
+        sample.weights *= family['weights'][bins]
@@ -0,0 +1,37 @@
+import os
+import uproot
+import numpy as np
+
+# tau energy scale per decay mode from the TauPOG TauES files, read once into
+# arrays; getTES gives the values of TauESTool.getTES for whole arrays
+class TauES(object):
+    def __init__(self, campaign, id='DeepTau2017v2p1VSjet', path="."):
+        low = uproot.open(os.path.join(path, "TauES_dm_{0}_{1}.root"
+                                       .format(id, campaign)))['tes']
+        high = uproot.open(os.path.join(path, "TauES_dm_{0}_{1}_ptgt100.root"
+                                        .format(id, campaign)))['tes']
+        self.edges = np.asarray(low.edges, dtype=float)
+        self.tes = np.asarray(low.values, dtype=float)
+        self.err_low = np.sqrt(np.asarray(low.variances, dtype=float))
+        self.edges_high = np.asarray(high.edges, dtype=float)
+        self.err_high = np.sqrt(np.asarray(high.variances, dtype=float))
+
+        # average tau pt of the Z->tautau and W*->taunu measurements, the
+        # uncertainty is interpolated linearly between them
+        self.pt_low, self.pt_high = 34., 170.
+        self.DMs = [0, 1, 10] if ('oldDM' in id) else [0, 1, 10, 11]
+
+    def find_bin(self, edges, dm):
+        return np.clip(np.digitize(dm, edges) - 1, 0, len(edges) - 2)
+
+    def getTES(self, pt, dm, genmatch=5, unc=None):
+        # only genuine taus (genmatch 5) of the measured decay modes are scaled
+        pt, dm, genmatch = np.asarray(pt), np.asarray(dm), np.asarray(genmatch)
+        i = self.find_bin(self.edges, dm)
+        tes = self.tes[i]
+        if unc in ['Up', 'Down']:
+            frac = np.clip((pt - self.pt_low)/(self.pt_high - self.pt_low), 0, 1)
+            err_high = self.err_high[self.find_bin(self.edges_high, dm)]
+            err = self.err_low[i] + (err_high - self.err_low[i])*frac
+            tes = tes + err if (unc == 'Up') else tes - err
+        return np.where((genmatch == 5) & np.isin(dm, self.DMs), tes, 1.0)[()]
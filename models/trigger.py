@@ -0,0 +1,42 @@
+import uproot
+import numpy as np
+
+# data/MC single-lepton trigger scale factors from a TriggerEffs file,
+# read once into (eta x pt) lookup tables
+class TriggerSF(object):
+    def __init__(self, path):
+        f = uproot.open(path)
+        eta_bins = f['etaBinsH']
+        self.eta_edges = np.asarray(eta_bins.edges, dtype=float)
+        self.abs_eta = (self.eta_edges[0] >= 0)
+
+        graphs = {}
+        for label in eta_bins.xlabels:
+            graphs[label] = (self.get_graph(f['ZMass{0}_Data'.format(label)]),
+                             self.get_graph(f['ZMass{0}_MC'.format(label)]))
+
+        # common pt binning, evaluated at each bin center
+        self.pt_edges = np.unique(np.concatenate([edges for data, mc in graphs.values()
+                                                  for graph in (data, mc)
+                                                  for edges in graph[:2]]))
+        pt = 0.5*(self.pt_edges[1:] + self.pt_edges[:-1])
+        self.eff_data = np.array([self.get_eff(data, pt) for data, mc in graphs.values()])
+        self.eff_mc   = np.array([self.get_eff(mc, pt) for data, mc in graphs.values()])
+        self.SF = np.ones_like(self.eff_data)
+        good = (self.eff_mc > 0)
+        self.SF[good] = self.eff_data[good]/self.eff_mc[good]
+
+    def get_graph(self, graph):
+        x, y = np.asarray(graph._fX), np.asarray(graph._fY)
+        return x - np.asarray(graph._fEXlow), x + np.asarray(graph._fEXhigh), y
+
+    def get_eff(self, graph, pt):
+        low, high, eff = graph
+        i = np.clip(np.searchsorted(low, pt, side='right') - 1, 0, len(eff) - 1)
+        return eff[i]
+
+    def get_SF(self, pt, eta):
+        if self.abs_eta: eta = np.abs(eta)
+        i_eta = np.clip(np.digitize(eta, self.eta_edges) - 1, 0, len(self.eta_edges) - 2)
+        i_pt = np.clip(np.digitize(pt, self.pt_edges) - 1, 0, len(self.pt_edges) - 2)
+        return self.SF[i_eta, i_pt]
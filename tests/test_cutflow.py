@@ -0,0 +1,104 @@
+import os
+import sys
+import zlib
+import numpy as np
+import boost_histogram as bh
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from models.sample import Sample
+from models.group import Group
+from models.reducible import Reducible
+from models.data import Data
+
+# the cutflow is filled once per sample from the per-event cut stage; these
+# tests compare it with filling every stage at the time it is marked, with
+# the mask and weights of that moment (the per-stage fills it replaced)
+
+CATEGORIES = {1:'eeet', 2:'eemt', 3:'eett', 4:'eeem',
+              5:'mmet', 6:'mmmt', 7:'mmtt', 8:'mmem'}
+N_ENTRIES = 5000
+
+def random_branch(name, n):
+    rng = np.random.RandomState(zlib.crc32(name.encode()))
+    if (name == 'cat'): return rng.randint(1, 9, n)
+    if name.startswith('q_'): return rng.choice([-1, 1], n)
+    if (name == 'nbtag'): return rng.choice([0, 0, 0, 1, 2], n)
+    if name.startswith('iso_'): return rng.uniform(0, 0.25, n)
+    if name.startswith(('isGlobal', 'isTracker', 'Electron_mva')):
+        return rng.choice([0, 1, 1, 1], n)
+    if name.startswith('idDeepTau'): return rng.randint(0, 32, n)
+    if name.startswith('gen_match'): return rng.choice([1, 3, 5, 5, 5, 5, 6, 15], n)
+    if name.startswith('pt_'): return rng.uniform(10, 120, n)
+    if (name == 'Generator_weight'): return rng.choice([-1., 1., 1., 1.], n)*rng.uniform(0.5, 1.5, n)
+    if (name == 'm_sv'): return rng.uniform(40, 260, n)
+    return rng.uniform(-2, 2, n)
+
+class FakeTree(object):
+    def __init__(self, n_entries):
+        self.numentries = n_entries
+        self.arrays = {}
+
+    def array(self, name, entrystart=0, entrystop=None):
+        if name not in self.arrays:
+            self.arrays[name] = random_branch(name, self.numentries)
+        return self.arrays[name][entrystart:entrystop]
+
+class FakeCatalog(object):
+    def get(self, path):
+        return {'entries':N_ENTRIES, 'size':0, 'mtime':0, 'branches':[]}
+
+class FakeSF(object):
+    def getSFvsEta(self, eta, match): return 1.0 + 0.1*eta
+    def getSFvsPT(self, pt, match): return 0.8 + pt/500.
+
+class FakeFitter(object):
+    branches = []
+    def fit(self, s, mask=None):
+        s.mtt_fit[mask] = 1.1*s.array('m_sv')[mask]
+
+def with_reference(group_class):
+    # records the cutflow the old way next to the one-pass cutflow
+    class Reference(group_class):
+        def mark_cutflow(self, fill_value, sample):
+            group_class.mark_cutflow(self, fill_value, sample)
+            for cat in self.categories.values():
+                good_evts = (sample.cats == cat) & sample.mask
+                self.reference[cat].fill(np.full(good_evts.sum(), fill_value),
+                                         weight=sample.weights[good_evts])
+    return Reference
+
+def make_group(group_class, tmpdir, *args):
+    sf = FakeSF()
+    group = with_reference(group_class)(CATEGORIES, sf, sf, sf, *args, fitter=FakeFitter())
+    group.reference = {cat:bh.Histogram(bh.axis.Regular(20, 0.0, 20.0))
+                       for cat in CATEGORIES.values()}
+    tree = FakeTree(N_ENTRIES)
+    sample = Sample('fake', 'fake.root', 1.0, 1.0, 0.7, lookup_path=str(tmpdir),
+                    catalog=FakeCatalog(), opener=lambda path, info: tree)
+    group.samples['fake'] = sample
+    return group, sample
+
+def check(group):
+    for cat in CATEGORIES.values():
+        np.testing.assert_allclose(group.cutflow_hists[cat].view(),
+                                   group.reference[cat].view(), rtol=1e-12, atol=1e-9)
+    assert sum(group.cutflow_hists[cat].sum() for cat in CATEGORIES.values()) != 0
+
+def test_group_cutflow(tmpdir):
+    group, _ = make_group(Group, tmpdir)
+    group.process_samples(tight_cuts=True, sign='OS', data_driven=True, tau_ID_SF=True,
+                          redo_fit=False, LT_cut=60)
+    check(group)
+
+def test_reducible_cutflow(tmpdir):
+    group, _ = make_group(Reducible, tmpdir)
+    group.process_samples(tight_cuts=True, sign='OS', data_driven=True, tau_ID_SF=True,
+                          redo_fit=False, LT_cut=60)
+    check(group)
+
+def test_data_cutflow(tmpdir):
+    group, sample = make_group(Data, tmpdir, 2017)
+    sample.duplicates = np.arange(0, N_ENTRIES, 7)
+    group.process_samples(tight_cuts=True, sign='SS', data_driven=True, tau_ID_SF=False,
+                          redo_fit=False, LT_cut=60)
+    check(group)
@@ -0,0 +1,81 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from models.fastmtt import (TAU_MASS, HADRONIC, LEPTONIC, p4, mass, x_min,
+                            mass_likelihood, fast_mtt)
+
+def numerical_mass_likelihood(m, m_vis, x1_min, x2_min, coeff_1, coeff_2):
+    # p1(x1) p2(x2) dx1 dx2 / dm on the line x1 = (m_vis/m)^2/x2
+    t = np.logspace(-9, 0, 2000001)
+    x1 = (m_vis/m)**2/t
+    inside = (x1 >= x1_min) & (x1 <= 1) & (t >= x2_min)
+    density = np.polyval(coeff_1[::-1], x1)*np.polyval(coeff_2[::-1], t)/t
+    density = np.where(inside, density, 0)
+    integral = np.sum(0.5*(density[1:] + density[:-1])*np.diff(t))
+    return integral*2*m_vis**2/m**3
+
+def test_mass_likelihood_matches_integral():
+    m_vis = 60.
+    for coeff_1, coeff_2, m_1, m_2 in [(HADRONIC, HADRONIC, 0.8, 0.14),
+                                       (LEPTONIC, HADRONIC, 0.105, 1.2),
+                                       (LEPTONIC, LEPTONIC, 0.000511, 0.105)]:
+        x1_min = x_min(m_1, coeff_1 is HADRONIC)
+        x2_min = x_min(m_2, coeff_2 is HADRONIC)
+        for m in [62., 80., 125., 250., 600.]:
+            expected = numerical_mass_likelihood(m, m_vis, x1_min, x2_min, coeff_1, coeff_2)
+            value = mass_likelihood(np.array(m), m_vis, x1_min, x2_min, coeff_1, coeff_2)
+            np.testing.assert_allclose(value, expected, rtol=1e-3, atol=1e-12)
+    assert mass_likelihood(np.array(50.), m_vis, 0.1, 0.1, HADRONIC, HADRONIC) == 0
+
+def decay_fraction(rng, hadronic, m_vis, n):
+    # visible fractions drawn from the densities of the fit
+    x = np.zeros(n)
+    for i in range(n):
+        while True:
+            x[i], u = rng.uniform(x_min(m_vis, hadronic), 1), rng.uniform(0, 5./3)
+            if hadronic or (u < np.polyval(LEPTONIC[::-1], x[i])): break
+    return x
+
+def boost(p, frame):
+    # p from the rest frame of frame to the lab
+    beta = frame[:3]/frame[3]
+    beta2 = np.sum(beta**2, axis=0)
+    gamma = 1/np.sqrt(1 - beta2)
+    bp = np.sum(beta*p[:3], axis=0)
+    space = p[:3] + ((gamma - 1)*bp/beta2 + gamma*p[3])*beta
+    return np.concatenate([space, [gamma*(p[3] + bp)]])
+
+def test_fit_recovers_resonance_mass():
+    rng = np.random.RandomState(1)
+    n, m_H = 400, 125.
+
+    # H -> tau tau, boosted to a random momentum
+    phi = rng.uniform(-np.pi, np.pi, n)
+    cos_theta = rng.uniform(-1, 1, n)
+    p = np.sqrt(m_H**2/4 - TAU_MASS**2)
+    sin_theta = np.sqrt(1 - cos_theta**2)
+    tau_1 = np.stack([p*sin_theta*np.cos(phi), p*sin_theta*np.sin(phi), p*cos_theta,
+                      np.full(n, m_H/2)])
+    tau_2 = tau_1*np.array([-1, -1, -1, 1])[:, None]
+    H = p4(rng.uniform(20, 100, n), rng.normal(0, 1, n), rng.uniform(-np.pi, np.pi, n), m_H)
+    tau_1, tau_2 = boost(tau_1, H), boost(tau_2, H)
+
+    # collinear visible products: tau_1 to a muon, tau_2 hadronic
+    x_1 = decay_fraction(rng, False, 0.105, n)
+    x_2 = decay_fraction(rng, True, 0.8, n)
+    vis_1, vis_2 = tau_1*x_1, tau_2*x_2
+    vis_1 = p4(np.hypot(vis_1[0], vis_1[1]), np.arcsinh(vis_1[2]/np.hypot(vis_1[0], vis_1[1])),
+               np.arctan2(vis_1[1], vis_1[0]), np.full(n, 0.105))
+    vis_2 = p4(np.hypot(vis_2[0], vis_2[1]), np.arcsinh(vis_2[2]/np.hypot(vis_2[0], vis_2[1])),
+               np.arctan2(vis_2[1], vis_2[0]), np.full(n, 0.8))
+
+    # MET from the neutrinos with 5 GeV resolution
+    nu = tau_1*(1 - x_1) + tau_2*(1 - x_2)
+    met_x, met_y = nu[0] + rng.normal(0, 5, n), nu[1] + rng.normal(0, 5, n)
+    cov = np.tile(np.diag([25., 25.]), (n, 1, 1))
+    masses = mass(fast_mtt(vis_1, vis_2, np.zeros(n, dtype=bool), np.ones(n, dtype=bool),
+                           met_x, met_y, cov))
+    assert abs(np.median(masses)/m_H - 1) < 0.05
+    assert np.median(mass(vis_1 + vis_2)) < 0.8*m_H
@@ -0,0 +1,36 @@
+import os
+import numpy as np
+
+from test_cutflow import CATEGORIES, N_ENTRIES, make_group
+from models.group import Group
+from models.selection import BITS
+
+REGIONS = {'SS_loose':"SS & btag & lepton & ~tight1", 'OS_no_btag':"OS & ~btag"}
+
+def run(tmpdir, tight_cuts=True, regions=(), selection_dir=None):
+    group, sample = make_group(Group, tmpdir)
+    for name in regions: group.add_region(name, REGIONS[name])
+    group.selection_dir = selection_dir
+    group.process_samples(tight_cuts=tight_cuts, sign='OS', data_driven=True,
+                          tau_ID_SF=True, redo_fit=False, LT_cut=60)
+    return group, sample
+
+def test_bits_recorded_without_tight_cuts(tmpdir):
+    _, sample = run(tmpdir, tight_cuts=False)
+    for name in ['OS', 'SS', 'btag', 'lepton', 'tight1', 'tight2']:
+        passed = (sample.selection & BITS[name]) != 0
+        assert 0 < passed.sum() < N_ENTRIES, name
+
+def test_refill_regions_not_configured_when_saved(tmpdir):
+    selection_dir = os.path.join(str(tmpdir), 'selections')
+    run(tmpdir, selection_dir=selection_dir)
+    configured, _ = run(tmpdir, regions=REGIONS)
+
+    refilled, _ = make_group(Group, tmpdir)
+    for name in REGIONS: refilled.add_region(name, REGIONS[name])
+    refilled.fill_saved_regions(selection_dir)
+    for region_var in refilled.region_hists:
+        for cat in CATEGORIES.values():
+            np.testing.assert_allclose(refilled.hists[region_var][cat].view(),
+                                       configured.hists[region_var][cat].view())
+    assert refilled.hists['mtt_fit_SS_loose']['mmtt'].sum() > 0
@@ -0,0 +1,46 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import models.tau_es
+from models.tau_es import TauES
+
+# TES hists binned in decay mode as in the TauPOG files
+EDGES = np.arange(-0.5, 12.)
+LOW = {'values':np.array([0.987, 0.995, 0, 0, 0, 0, 0, 0, 0, 0, 0.988, 0.993]),
+       'errors':np.array([0.008, 0.006, 0, 0, 0, 0, 0, 0, 0, 0, 0.007, 0.012])}
+HIGH = {'values':np.array([0.990, 0.997, 0, 0, 0, 0, 0, 0, 0, 0, 0.992, 0.995]),
+        'errors':np.array([0.030, 0.020, 0, 0, 0, 0, 0, 0, 0, 0, 0.027, 0.040])}
+
+class FakeHist(object):
+    def __init__(self, hist):
+        self.edges, self.values = EDGES, hist['values']
+        self.variances = hist['errors']**2
+
+def fake_open(path):
+    return {'tes':FakeHist(HIGH if path.endswith('ptgt100.root') else LOW)}
+
+def reference_TES(pt, dm, genmatch, unc=None):
+    # TauESTool.getTES, one tau at a time
+    if (genmatch != 5 or dm not in [0, 1, 10, 11]): return 1.0
+    i = int(np.digitize(dm, EDGES)) - 1
+    tes = LOW['values'][i]
+    if (unc is None): return tes
+    if (pt >= 170.): err = HIGH['errors'][i]
+    elif (pt > 34.):
+        err = LOW['errors'][i] + (HIGH['errors'][i] - LOW['errors'][i])/(170. - 34.)*(pt - 34.)
+    else: err = LOW['errors'][i]
+    return tes + err if (unc == 'Up') else tes - err
+
+def test_tes_matches_per_tau_lookup(monkeypatch):
+    monkeypatch.setattr(models.tau_es.uproot, 'open', fake_open)
+    tool = TauES('2017ReReco')
+    rng = np.random.RandomState(0)
+    pt = rng.uniform(20, 250, 1000)
+    dm = rng.choice([0, 1, 2, 5, 10, 11], 1000)
+    genmatch = rng.choice([1, 2, 3, 4, 5, 6], 1000)
+    for unc in [None, 'Up', 'Down']:
+        expected = [reference_TES(*args, unc=unc) for args in zip(pt, dm, genmatch)]
+        np.testing.assert_allclose(tool.getTES(pt, dm, genmatch, unc=unc), expected)
+    assert tool.getTES(50., 1, 5) == LOW['values'][1]
@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import multiprocessing
+import numpy as np
+import boost_histogram as bh
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from models.shards import WorkQueue, plan_shards, merge_hists
+
+# stand-ins for the groups and samples of make_hists.py: each sample is a
+# fixed random array, and a shard fills its entry range into a hist
+SAMPLES = {'sample_A':(0, 10000), 'sample_B':(1, 3300), 'sample_C':(2, 512)}
+
+class FakeSample(object):
+    def __init__(self, name):
+        self.name = name
+        self.n_entries = SAMPLES[name][1]
+        self.lookup_path = "."
+
+class FakeGroup(object):
+    def __init__(self):
+        self.samples = {name:FakeSample(name) for name in SAMPLES}
+
+def values(name):
+    seed, n_entries = SAMPLES[name]
+    return np.random.RandomState(seed).normal(100, 30, n_entries)
+
+def fill(name, start, stop):
+    hist = bh.Histogram(bh.axis.Regular(20, 0, 200))
+    hist.fill(values(name)[start:stop])
+    return {'mA':{1:hist}}
+
+def worker(path):
+    queue = WorkQueue(path)
+    shard = queue.claim()
+    while shard is not None:
+        heartbeat = queue.heartbeat(shard, interval=0.01)
+        try: hists = fill(shard['sample'], shard['start'], shard['stop'])
+        finally: heartbeat.set()
+        queue.complete(shard, hists, 0.)
+        shard = queue.claim()
+
+def run_workers(path, n_workers=4):
+    workers = [multiprocessing.Process(target=worker, args=(path,))
+               for i in range(n_workers)]
+    for w in workers: w.start()
+    for w in workers: w.join()
+    assert all(w.exitcode == 0 for w in workers)
+
+def single_process():
+    hist = bh.Histogram(bh.axis.Regular(20, 0, 200))
+    for name in SAMPLES: hist.fill(values(name))
+    return hist
+
+def plan(path):
+    queue = WorkQueue(path)
+    costs = {name:1e-3 for name in SAMPLES}
+    queue.create(plan_shards({'Signal':FakeGroup()}, 'FastMTT', costs=costs,
+                             shard_seconds=1.))
+    return queue
+
+def test_workers_match_single_process(tmpdir):
+    queue = plan(str(tmpdir))
+    assert queue.pending()['todo'] > 4
+    run_workers(str(tmpdir))
+    assert not any(queue.pending().values())
+    merged = merge_hists(queue.results())['Signal']['mA'][1]
+    np.testing.assert_allclose(merged.view(), single_process().view())
+
+def test_requeue_stale_and_failed(tmpdir):
+    queue = plan(str(tmpdir))
+
+    # a worker killed while holding a shard, and a shard that failed
+    killed = queue.claim()
+    old = time.time() - 3600
+    os.utime(os.path.join(queue.dirs['running'], killed['id'] + '.yaml'), (old, old))
+    queue.fail(queue.claim())
+
+    # a live worker's shard stays running
+    live = queue.claim()
+    assert queue.requeue(lease_seconds=600.) == {'running':1, 'failed':1}
+    assert queue.pending()['running'] == 1
+    queue.complete(live, fill(live['sample'], live['start'], live['stop']), 0.)
+
+    run_workers(str(tmpdir))
+    assert not any(queue.pending().values())
+    merged = merge_hists(queue.results())['Signal']['mA'][1]
+    np.testing.assert_allclose(merged.view(), single_process().view())
+
+def test_small_remainders_join_the_last_shard():
+    group = FakeGroup()
+    shards = plan_shards({'Signal':group}, 'FastMTT', costs={name:1e-3 for name in SAMPLES},
+                         shard_seconds=1.)
+    for name, sample in group.samples.items():
+        ranges = sorted((s['start'], s['stop']) for s in shards if s['sample'] == name)
+        assert ranges[0][0] == 0 and ranges[-1][1] == sample.n_entries
+        assert all(a[1] == b[0] for a, b in zip(ranges[:-1], ranges[1:]))
+        assert all(stop - start >= 500 for start, stop in ranges) or len(ranges) == 1
+    # sample_B: 300 remaining entries go into the third shard
+    assert sorted(s['stop'] - s['start'] for s in shards
+                  if s['sample'] == 'sample_B') == [1000, 1000, 1300]